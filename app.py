@@ -1,11 +1,18 @@
 import streamlit as st
-import pandas as pd
-import requests
 import openai
 import os
 import time
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
 from dotenv import load_dotenv
 from improved_voice_input import voice_input
+from beautymate.sample_catalog import SAMPLE_CATALOG
+from cards import PLACEHOLDER_IMAGE, card_cache_stats, render_card, render_grid
+from beautymate.clients import connection_stats
+from chat_memory import ChatMemory
+from session_schema import AGE_GROUPS, SKIN_TYPES, Profile, RecommendationRef, recommendation_ref
+from thumbnails import ThumbnailCache
+from beautymate.core import BeautyMate, DESCRIPTION_TIMEOUT, fallback_description, short_description
+from beautymate import metrics
 
 
 # Load environment variables and set OpenAI key
@@ -50,17 +57,14 @@ st.markdown(hero_html, unsafe_allow_html=True)
 with st.sidebar:
     st.markdown("<div class='sidebar-header'>👤 Your Profile</div>", unsafe_allow_html=True)
     if 'profile' not in st.session_state:
-        st.session_state.profile = {}
+        st.session_state.profile = Profile()
 
-    name = st.text_input("Your Name", value=st.session_state.profile.get("name", ""))
-    age_group = st.selectbox("Age Range", ["Under 18", "18-24", "25-34", "35-44", "45+"])
-    skin_type = st.radio("Skin Type", ["Dry", "Oily", "Combination", "Normal"])
+    name = st.text_input("Your Name", value=st.session_state.profile.name)
+    age_group = st.selectbox("Age Range", AGE_GROUPS)
+    skin_type = st.radio("Skin Type", SKIN_TYPES)
 
-    st.session_state.profile = {
-        "name": name,
-        "age_group": age_group,
-        "skin_type": skin_type
-    }
+    # Kept as enum codes, see session_schema.py
+    st.session_state.profile = Profile(name, age_group, skin_type)
 
 # --------------------------
 # 3. LOADING SKELETON STYLE
@@ -79,6 +83,9 @@ skeleton_html = """
 </style>
 """
 
+# Single-line skeleton used inside the product grid (shimmer keyframes live in apply_custom_css)
+skeleton_card_html = "<div class='card-skeleton'></div>"
+
 
 def display_loading_skeletons():
     cols = st.columns(2)
@@ -88,8 +95,8 @@ def display_loading_skeletons():
 
 
 # Use profile info to personalize greeting
-if 'profile' in st.session_state and st.session_state.profile.get("name"):
-    st.markdown(f"### 👋 Hello, {st.session_state.profile['name']}! Let's find what works best for your {st.session_state.profile['skin_type']} skin.")
+if 'profile' in st.session_state and st.session_state.profile.name:
+    st.markdown(f"### 👋 Hello, {st.session_state.profile.name}! Let's find what works best for your {st.session_state.profile.skin_type} skin.")
 
 
 
@@ -198,6 +205,29 @@ def apply_custom_css():
         text-transform: uppercase;
     }
 
+    .product-grid {
+        display: grid;
+        grid-template-columns: repeat(2, minmax(0, 1fr));
+        column-gap: 24px;
+    }
+    @media (max-width: 640px) {
+        .product-grid {
+            grid-template-columns: minmax(0, 1fr);
+        }
+    }
+    .card-skeleton {
+        border-radius: 10px;
+        background: linear-gradient(-90deg, #eeeeee 0%, #dddddd 50%, #eeeeee 100%);
+        background-size: 200% 100%;
+        animation: shimmer 1.5s infinite;
+        height: 250px;
+        margin: 15px 0;
+    }
+    @keyframes shimmer {
+        0% { background-position: 200% 0; }
+        100% { background-position: -200% 0; }
+    }
+
     /* Chat container styles */
     .chat-container {
         background: #f8f9fa;
@@ -287,215 +317,27 @@ def apply_custom_css():
     """, unsafe_allow_html=True)
 
 
-# MODIFIED: Function to fetch products with improved error handling and using sample data by default
-def fetch_makeup_products(category=None, brand=None):
-    # Default to sample data - more stable than relying on the external API
-    sample_data = get_sample_products(category)
+# The recommendation core (beautymate/core.py): catalog snapshot and indexes, description and answer
+# caches, single-flight tables and the OpenAI worker pool, shared by all sessions of this process.
+# The catalog is refreshed from makeup-api in the background; sessions always get the last good snapshot.
+@st.cache_resource
+def get_core():
+    return BeautyMate().start()
 
-    # If we have enough sample data for the current request, just use that
-    if len(sample_data) >= 5 or (category is not None and brand is not None):
-        return sample_data
 
-    # Try the API only as a fallback for more variety
-    base_url = "http://makeup-api.herokuapp.com/api/v1/products.json"
-    params = {}
-    if category:
-        params['product_type'] = category.lower()
-    if brand:
-        params['brand'] = brand.lower()
+# Local card-size thumbnails of product images, shared by all sessions
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache()
 
-    try:
-        # Increase timeout to prevent hanging but don't wait too long
-        response = requests.get(base_url, params=params, timeout=5)
-        if response.status_code == 200:
-            products = response.json()
-            if products:  # If we got valid data
-                df = pd.DataFrame(products)
-                if not df.empty:
-                    return df
-        # For any issues, silently fall back to sample data
-        return sample_data
-    except Exception:
-        # Don't show warning, just use sample data
-        return sample_data
-
-
-# IMPROVED: Enhanced sample data function with more products and categories
-def get_sample_products(category=None):
-    # Create comprehensive sample data with different categories
-    sample_data = [
-        {
-            "name": "Natural Glow Bronzer",
-            "brand": "EarthLab Cosmetics",
-            "price": "28.99",
-            "image_link": "https://images.unsplash.com/photo-1599733594230-6b823276abcc?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "bronzer",
-            "rating": 4.8,
-            "description": "A natural bronzer that gives a sun-kissed glow."
-        },
-        {
-            "name": "Radiant Blush Duo",
-            "brand": "Pure Beauty",
-            "price": "24.50",
-            "image_link": "https://images.unsplash.com/photo-1581514578022-3aafd55bbe4b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "blush",
-            "rating": 4.5,
-            "description": "A dual-color blush for the perfect cheek definition."
-        },
-        {
-            "name": "Long-lasting Matte Lipstick",
-            "brand": "ColorPop",
-            "price": "19.99",
-            "image_link": "https://images.unsplash.com/photo-1586495777744-4413f21062fa?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "lipstick",
-            "rating": 4.7,
-            "description": "A creamy matte lipstick that lasts all day."
-        },
-        {
-            "name": "Waterproof Mascara",
-            "brand": "Lash Focus",
-            "price": "22.00",
-            "image_link": "https://images.unsplash.com/photo-1591360236480-4ed861025fa1?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "mascara",
-            "rating": 4.6,
-            "description": "Volumizing and lengthening mascara that's truly waterproof."
-        },
-        {
-            "name": "Shimmer Eyeshadow Palette",
-            "brand": "Glimmer",
-            "price": "32.00",
-            "image_link": "https://images.unsplash.com/photo-1583241119308-050d4c933519?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "eyeshadow",
-            "rating": 4.9,
-            "description": "A palette of 12 shimmer eyeshadows for creating stunning looks."
-        },
-        # Adding more sample data for variety
-        {
-            "name": "Hydrating Foundation",
-            "brand": "SkinGlow",
-            "price": "35.99",
-            "image_link": "https://images.unsplash.com/photo-1590156206058-ae06662e566b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "foundation",
-            "rating": 4.7,
-            "description": "A moisturizing foundation for dry skin types."
-        },
-        {
-            "name": "Precision Eyeliner",
-            "brand": "Line Perfect",
-            "price": "18.50",
-            "image_link": "https://images.unsplash.com/photo-1631214503374-35d266ee804e?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "eyeliner",
-            "rating": 4.8,
-            "description": "A fine-tip eyeliner for precise application."
-        },
-        {
-            "name": "Brow Definer Pencil",
-            "brand": "BrowMaster",
-            "price": "16.99",
-            "image_link": "https://images.unsplash.com/photo-1597225244660-1cd128c64284?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "eyebrow",
-            "rating": 4.6,
-            "description": "Define and shape your brows with this precision pencil."
-        },
-        {
-            "name": "Creamy Lip Liner",
-            "brand": "LipDefine",
-            "price": "15.00",
-            "image_link": "https://images.unsplash.com/photo-1600612253971-422e7f7faeb6?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "lip liner",
-            "rating": 4.4,
-            "description": "A smooth, non-drying lip liner that prevents feathering."
-        },
-        {
-            "name": "Quick-Dry Nail Polish",
-            "brand": "NailPro",
-            "price": "12.99",
-            "image_link": "https://images.unsplash.com/photo-1603481588273-2f908a9a7a1b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": "nail polish",
-            "rating": 4.3,
-            "description": "Fast-drying, chip-resistant nail polish in vibrant colors."
-        }
-    ]
-
-    # Filter by category if specified
-    if category and category.lower() != "all":
-        filtered_data = [p for p in sample_data if p["product_type"].lower() == category.lower()]
-        # If we have matching products, return those
-        if filtered_data:
-            return pd.DataFrame(filtered_data)
-
-    # Return all sample data if no category specified or no matches
-    if category and category.lower() != "all" and not any(
-            p["product_type"].lower() == category.lower() for p in sample_data):
-        # Add one generic product for the requested category
-        sample_data.append({
-            "name": f"Premium {category.title() if category else 'Beauty Product'}",
-            "brand": "BeautyMate",
-            "price": "25.00",
-            "image_link": "https://images.unsplash.com/photo-1596462502278-27bfdc403348?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
-            "product_type": category.lower() if category else "makeup",
-            "rating": 4.5,
-            "description": f"A high-quality {category.lower() if category else 'beauty product'}."
-        })
-
-    return pd.DataFrame(sample_data)
-
-
-# Generate personalized description using OpenAI
-def generate_personalized_description(product, gender):
-    try:
-        # Check if OpenAI client is available
-        client = openai.OpenAI() if hasattr(openai, 'OpenAI') else None
-        
-        if not client:
-            # Improved fallback descriptions based on gender
-            if gender.lower() == "male":
-                return f"This premium {product['product_type']} is specially formulated for men's skin. It offers a natural finish and long-lasting performance for a confident look all day."
-            elif gender.lower() == "female":
-                return f"This luxurious {product['product_type']} is perfect for enhancing your natural beauty. It provides exceptional coverage and staying power for a flawless finish."
-            else:
-                return f"This versatile {product['product_type']} works beautifully for all users. It's carefully formulated to complement any look while providing professional-quality results."
-
-        product_name = product.get('name', 'Product')
-        brand = product.get('brand', 'Brand')
-        category = product.get('product_type', 'Beauty Product')
-        price = product.get('price', '0.00')
-        rating = product.get('rating', 0)
-
-        prompt = f"""
-        Create a compelling 3-sentence product description for a beauty recommendation system.
-        Product: {product_name}
-        Brand: {brand}
-        Category: {category}
-        Price: ${price}
-        Rating: {rating}/5
-        Gender: {gender}
-
-        Focus on why this product is perfect for {gender} users.
-        Highlight its key benefits. Keep it professional but engaging.
-        """
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful beauty product recommendation assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        # More detailed fallback descriptions based on product type and gender
-        product_type = product.get('product_type', '').lower()
-
-        if product_type == "foundation":
-            return f"This foundation provides flawless coverage while letting your skin breathe. Perfect for {gender.lower()} users looking for a natural finish that lasts all day."
-        elif product_type == "lipstick":
-            return f"This richly pigmented lipstick offers vibrant color and moisturizing comfort. Specially formulated to complement {gender.lower()} users with long-lasting, crease-resistant wear."
-        elif product_type == "mascara":
-            return f"Achieve dramatic lashes with this volumizing and lengthening mascara. Designed for {gender.lower()} users who want smudge-proof definition that lasts from day to night."
-        else:
-            return f"This premium {product_type} delivers professional-quality results with every use. Specially formulated for {gender.lower()} users with high-performance ingredients for outstanding results."
+
+# Image URL for a product card: a local thumbnail once it has been fetched, the original image until then
+def card_image_url(product):
+    return get_thumbnail_cache().url_for(product.get('image_link', PLACEHOLDER_IMAGE))
+
+
+def render_product_card(product, gender, description):
+    return render_card(product, gender, description, card_image_url(product))
 
 
 # Display recommendations using Streamlit components with a grid layout
@@ -504,118 +346,53 @@ def display_recommendations(recommendations_df, gender):
         st.warning("No matching products found. Try adjusting your preferences.")
         return
 
-    # Create a better grid layout with columns
-    num_products = len(recommendations_df)
+    started = time.perf_counter()
+    products = [recommendations_df.iloc[i] for i in range(len(recommendations_df))]
+    futures = get_core().describe_many(products, gender)
 
-    # Use two columns for better layout
-    for i in range(0, num_products, 2):
-        cols = st.columns(2)
+    # The whole grid is one markdown block; cards still waiting for a description show a skeleton
+    grid = st.empty()
+    cells = [render_product_card(product, gender, future.result()) if future.done() else skeleton_card_html
+             for product, future in zip(products, futures)]
+    pending = {future: i for i, future in enumerate(futures) if not future.done()}
+    grid.markdown(render_grid(cells), unsafe_allow_html=True)
+    metrics.observe("render", time.perf_counter() - started, stage="first_paint")
 
-        # First column
-        with cols[0]:
-            if i < num_products:
-                product = recommendations_df.iloc[i]
-                display_product_card(product, gender)
+    # Fill in cards as their descriptions arrive; anything still running after the timeout gets fallback text
+    try:
+        for future in as_completed(pending, timeout=DESCRIPTION_TIMEOUT):
+            i = pending.pop(future)
+            cells[i] = render_product_card(products[i], gender, future.result())
+            grid.markdown(render_grid(cells), unsafe_allow_html=True)
+    except FuturesTimeoutError:
+        metrics.inc("llm_fallbacks", len(pending), call="description", reason="render_timeout")
+        for i in pending.values():
+            cells[i] = render_product_card(products[i], gender, fallback_description(products[i], gender))
+        grid.markdown(render_grid(cells), unsafe_allow_html=True)
+    metrics.observe("render", time.perf_counter() - started, stage="all_cards")
+
+
+# "More like this": pick one of the recommendations and show its nearest neighbours.
+# Cards use the catalog's own description so browsing doesn't trigger any OpenAI calls.
+def display_similar_products(recommendations_df, gender):
+    names = list(recommendations_df['name'])
+    choice = st.selectbox("🔎 More like this", ["Choose a product"] + names)
+    if choice not in names:
+        return
 
-        # Second column
-        with cols[1]:
-            if i + 1 < num_products:
-                product = recommendations_df.iloc[i + 1]
-                display_product_card(product, gender)
+    similar_df = get_core().similar(recommendations_df.iloc[names.index(choice)])
+    if similar_df is None or similar_df.empty:
+        st.caption("No similar products found.")
+        return
+    cells = [render_product_card(product, gender, short_description(product, gender))
+             for product in (similar_df.iloc[i] for i in range(len(similar_df)))]
+    st.markdown(render_grid(cells), unsafe_allow_html=True)
 
 
-# Helper function to display a single product card
-def display_product_card(product, gender):
-    with st.container():
-        # Create the product card container
-        st.markdown("""
-        <div class="product-card">
-            <div class="card-image-container">
-                <img class="card-img" src="{image_url}" alt="{product_name}">
-                <div class="card-category">{category}</div>
-            </div>
-            <div class="card-content">
-                <h3 class="card-title">{product_name}</h3>
-                <p class="card-brand">by {brand}</p>
-                <p class="card-description">{description}</p>
-                <div class="card-footer">
-                    <span class="card-price">${price}</span>
-                    <span class="card-rating">⭐ {rating}/5</span>
-                </div>
-            </div>
-        </div>
-        """.format(
-            image_url=product.get('image_link', 'https://via.placeholder.com/400x200?text=Product+Image'),
-            product_name=product.get('name', 'Product'),
-            category=product.get('product_type', 'Beauty').title(),
-            brand=product.get('brand', 'Brand'),
-            description=generate_personalized_description(product, gender),
-            price=float(product.get('price', 0)),
-            rating=product.get('rating', '4.5')
-        ), unsafe_allow_html=True)
-
-
-# Beauty consultant response using locally defined responses when OpenAI is unavailable
-def get_beauty_consultant_response(user_question, gender):
-    try:
-        # Check if OpenAI client is available
-        client = openai.OpenAI() if hasattr(openai, 'OpenAI') else None
-        
-        if not client:
-            # Common beauty questions and predefined responses
-            beauty_qa = {
-                "foundation": f"For choosing the right foundation, match it to your jawline in natural light. If you're {gender.lower()}, look for formulas designed for your skin type - dry, oily, or combination. Test a few shades to find your perfect match.",
-                "lipstick": f"When selecting lipstick, consider your skin undertone - cool tones look best with blue-reds, warm tones with orange-reds. For {gender.lower()} users, matte formulas last longer while creams are more hydrating.",
-                "eyeshadow": f"The best eyeshadows for {gender.lower()} users depend on your eye color. Brown eyes pop with purples and blues, green eyes with rusty reds, and blue eyes with warm bronzes and coppers. Start with a neutral palette for versatility.",
-                "mascara": "For the best mascara application, wiggle the wand at the base of your lashes then sweep upward. Curling your lashes first creates an eye-opening effect, and you can layer for more drama.",
-                "bronzer": f"Apply bronzer where the sun naturally hits: forehead, cheekbones, bridge of nose, and jawline. For {gender.lower()} users, choose a shade just 1-2 tones deeper than your skin for the most natural result.",
-                "blush": "For blush placement, smile and apply to the apples of your cheeks, then blend upward toward your temples. Cream blushes work well for dry skin, while powders are better for oily skin.",
-                "skincare": f"A basic skincare routine should include cleanser, moisturizer, and sunscreen. For {gender.lower()} users, add a serum with ingredients targeting your specific concerns like vitamin C for brightness or hyaluronic acid for hydration."
-            }
-
-            # Check if any keywords from the question match our predefined answers
-            question_lower = user_question.lower()
-            for keyword, response in beauty_qa.items():
-                if keyword in question_lower:
-                    return response
-
-            # Generic response if no keywords match
-            return f"Thank you for your beauty question! For {gender.lower()} users, I generally recommend starting with quality products suited to your skin type and tone. Could you provide more details about what specific beauty advice you're looking for?"
-
-        prompt = f"""
-        You are a professional beauty consultant named Sofi. The user has asked the following question:
-        "{user_question}"
-
-        Provide a helpful, personalized response about beauty products or techniques.
-        User's gender preference: {gender}
-
-        Keep your response friendly, concise (max 3-4 sentences), and actionable.
-        Include specific product types when relevant, but don't mention specific brands.
-        """
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are Sofi, a knowledgeable and friendly virtual beauty consultant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=200
-        )
-        return response.choices[0].message.content.strip()
-    except Exception:
-        # Fall back to the keyword-based system if API fails
-        question_lower = user_question.lower()
-        for keyword, response in {
-            "foundation": f"For {gender.lower()} users, I recommend matching foundation to your jawline in natural light. Look for formulas that suit your skin type. Consider testing samples before purchasing a full-size product.",
-            "lipstick": f"When choosing lipstick colors for {gender.lower()} users, consider your undertone. Warm skin looks great with orange-reds, while cool skin pairs well with blue-reds and berries.",
-            "eyeshadow": f"For {gender.lower()} users, I suggest starting with a neutral palette that complements your eye color. Apply lighter shades on the lid and darker colors in the crease for dimension.",
-            "skincare": f"A good skincare routine for {gender.lower()} users includes cleansing, moisturizing, and sun protection. Add targeted treatments based on your specific concerns like acne, aging, or hyperpigmentation."
-        }.items():
-            if keyword in question_lower:
-                return response
-
-        return "I'd be happy to help with your beauty questions! For personalized recommendations, I need to know more about your skin type, concerns, and preferences. Could you share a bit more about what you're looking for?"
+# Messages kept verbatim per session, messages rendered per "page", and tokens of history sent to the model
+CHAT_MAX_MESSAGES = 60
+CHAT_WINDOW = 20
+CHAT_CONTEXT_TOKENS = 800
 
 
 # Display Beauty Consultant Chat Interface with pop-out box
@@ -625,8 +402,10 @@ def get_beauty_consultant_response(user_question, gender):
 def display_beauty_consultant(gender):
     if 'chat_visible' not in st.session_state:
         st.session_state.chat_visible = False
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+    if 'chat_memory' not in st.session_state:
+        st.session_state.chat_memory = ChatMemory(max_messages=CHAT_MAX_MESSAGES)
+    if 'chat_window' not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW
     if 'user_question' not in st.session_state:
         st.session_state.user_question = ""
     
@@ -651,12 +430,21 @@ def display_beauty_consultant(gender):
                 - Speak clearly and not too quickly
                 """)
 
+    chat_panel(gender)
+
+
+# The chat is a fragment: sending a message or opening/closing the panel reruns only this
+# function instead of the whole script (hero, sidebar and the recommendations grid)
+@st.fragment
+@metrics.timed("chat_panel")
+def chat_panel(gender):
     def add_welcome_message():
-        if not any(msg["role"] == "assistant" and "I'm Sofi" in msg["content"] for msg in st.session_state.chat_history):
-            st.session_state.chat_history.insert(0, {
-                "role": "assistant",
-                "content": f"Hi there! I'm Sofi, your virtual beauty consultant 💋. Ask me anything beauty-related like 'What blush suits dry skin?' or 'How to pick foundation for oily skin?'"
-            })
+        memory = st.session_state.chat_memory
+        if len(memory) == 0 and not memory.folded:
+            memory.append(
+                "assistant",
+                "Hi there! I'm Sofi, your virtual beauty consultant 💋. Ask me anything beauty-related like 'What blush suits dry skin?' or 'How to pick foundation for oily skin?'"
+            )
 
     if st.session_state.chat_visible:
         add_welcome_message()
@@ -682,17 +470,22 @@ def display_beauty_consultant(gender):
             with col2:
                 st.markdown("<div class='chat-header'>Beauty Consultant: Sofi</div>", unsafe_allow_html=True)
             with col3:
-                if st.button("✕", key="close_chat"):
-                    st.session_state.chat_visible = False
-                    st.rerun()
-
-            # Display message history
-            for message in st.session_state.chat_history:
+                st.button("✕", key="close_chat", on_click=set_chat_visible, args=(False,))
+
+            # Display the most recent messages; older ones load on demand
+            memory = st.session_state.chat_memory
+            hidden = memory.hidden_count(st.session_state.chat_window)
+            if hidden:
+                st.button(f"⬆ Load earlier messages ({hidden})", key="load_earlier", on_click=load_earlier_messages)
+            for message in memory.messages(st.session_state.chat_window):
                 if message["role"] == "user":
                     st.markdown(f"<div class='user-message'>{message['content']}</div>", unsafe_allow_html=True)
                 else:
                     st.markdown(f"<div class='assistant-message'>{message['content']}</div>", unsafe_allow_html=True)
 
+            # The next exchange streams in here, right below the history
+            pending_exchange = st.empty()
+
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.markdown("#### 🎙️ Speak or type your question below:")
@@ -701,36 +494,40 @@ def display_beauty_consultant(gender):
                 st.text_input("Or type here:", key="user_question")
             with col2:
                 st.markdown("<br>", unsafe_allow_html=True)
-                if st.button("Send"):
-                    user_input = st.session_state.get("user_question", "")
-                    if user_input:
-                        st.session_state.chat_history.append({"role": "user", "content": user_input})
-                        with st.spinner("Sofi is thinking..."):
-                            response = get_beauty_consultant_response(user_input, gender)
-                        st.session_state.chat_history.append({"role": "assistant", "content": response})
-
-                        # Speak the response
-                        safe_response = response.replace('"', '\\"').replace("'", "\\'").replace('\n', ' ')
-                        st.markdown(f"""
-                            <script>
-                            try {{
-                                if ('speechSynthesis' in window) {{
-                                    var msg = new SpeechSynthesisUtterance("{safe_response}");
-                                    msg.lang = "en-US";
-                                    window.speechSynthesis.speak(msg);
-                                }}
-                            }} catch(e) {{
-                                console.error("Speech synthesis error:", e);
-                            }}
-                            </script>
-                        """, unsafe_allow_html=True)
-
-                        # 🔁 Clear user input safely to avoid Streamlit error
-                        if "user_question" in st.session_state:
-                            del st.session_state["user_question"]
-                        st.rerun()
-                    else:
-                        st.warning("Please enter a question first!")
+                st.button("Send", on_click=queue_question)
+                user_input = st.session_state.pop("pending_question", None)
+                if user_input == "":
+                    st.warning("Please enter a question first!")
+
+            if user_input:
+                context = memory.build_context(CHAT_CONTEXT_TOKENS)
+                memory.append("user", user_input)
+                with pending_exchange.container():
+                    st.markdown(f"<div class='user-message'>{user_input}</div>", unsafe_allow_html=True)
+                    answer_slot = st.empty()
+                    answer_slot.markdown("<div class='assistant-message'>Sofi is thinking...</div>", unsafe_allow_html=True)
+                    response = ""
+                    for text in get_core().stream_answer(user_input, gender, st.session_state.profile.skin_type, context):
+                        response += text
+                        answer_slot.markdown(f"<div class='assistant-message'>{response}</div>", unsafe_allow_html=True)
+                response = response.strip()
+                memory.append("assistant", response)
+
+                # Speak the response
+                safe_response = response.replace('"', '\\"').replace("'", "\\'").replace('\n', ' ')
+                st.markdown(f"""
+                    <script>
+                    try {{
+                        if ('speechSynthesis' in window) {{
+                            var msg = new SpeechSynthesisUtterance("{safe_response}");
+                            msg.lang = "en-US";
+                            window.speechSynthesis.speak(msg);
+                        }}
+                    }} catch(e) {{
+                        console.error("Speech synthesis error:", e);
+                    }}
+                    </script>
+                """, unsafe_allow_html=True)
 
             st.markdown("</div>", unsafe_allow_html=True)
 
@@ -742,15 +539,50 @@ def display_beauty_consultant(gender):
                 Need Help? Ask Sofi 💬
             </div>
             """, unsafe_allow_html=True)
-            if st.button("💋 Chat with Sofi", key="open_chat"):
-                st.session_state.chat_visible = True
-                st.rerun()
+            st.button("💋 Chat with Sofi", key="open_chat", on_click=set_chat_visible, args=(True,))
+
+
+# Button callbacks run before the fragment reruns, so no explicit st.rerun is needed
+def set_chat_visible(visible):
+    st.session_state.chat_visible = visible
+
+
+def load_earlier_messages():
+    st.session_state.chat_window += CHAT_WINDOW
+
+
+def queue_question():
+    # Move the typed question aside and clear the input box (only allowed before the widget is drawn again)
+    st.session_state.pending_question = st.session_state.get("user_question", "")
+    st.session_state.user_question = ""
+
+# The session's recommendations as rows, or None; a version the catalog no longer keeps resolves to None
+def session_recommendations():
+    stored = st.session_state.get('recommendations')
+    if isinstance(stored, RecommendationRef):
+        return get_core().rows(stored.version, stored.row_ids)
+    return stored
+
+
+# Export metrics (see beautymate/metrics.py) and register the components that keep their own statistics
+@st.cache_resource
+def start_metrics():
+    metrics.register_collector("description_cache", lambda: get_core().description_cache.stats())
+    metrics.register_collector("answer_cache", lambda: get_core().answer_cache.stats())
+    metrics.register_collector("card_cache", card_cache_stats)
+    metrics.register_collector("thumbnails", lambda: get_thumbnail_cache().stats())
+    metrics.register_collector("catalog", lambda: get_core().provider.stats())
+    metrics.register_collector("catalog_flight", lambda: get_core().catalog_flight.stats())
+    metrics.register_collector("description_flight", lambda: get_core().description_flight.stats())
+    metrics.register_collector("connections", connection_stats)
+    metrics.start_exporters()
+    return True
+
 
 # Main Streamlit App Function
 def main():
-    # Initialize OpenAI client if API key is available
-    client = openai.OpenAI() if hasattr(openai, 'OpenAI') and os.getenv("OPENAI_API_KEY") else None
-    
+    if metrics.ENABLED:
+        start_metrics()
     apply_custom_css()
     st.markdown("<div class='main-header'>💄 BeautyMate: Your Personalized Beauty Guide</div>", unsafe_allow_html=True)
 
@@ -758,11 +590,11 @@ def main():
     with st.sidebar:
         st.markdown("<div class='sidebar-header'>🎯 Your Preferences</div>", unsafe_allow_html=True)
 
-        # Use sample data to build consistent filter lists, avoiding API failures
-        sample_df = get_sample_products()
-        available_categories = sorted(sample_df['product_type'].dropna().unique())
-        available_brands = sorted(sample_df['brand'].dropna().unique())
+        # Use the sample catalog's precomputed vocabularies for consistent filter lists
+        available_categories = SAMPLE_CATALOG.categories
+        available_brands = SAMPLE_CATALOG.brands
 
+        search_query = st.text_input("🔍 Search products", placeholder="e.g. matte lipstick, waterproof mascara")
         category = st.selectbox("Product Category", ["All"] + list(available_categories))
         brand = st.selectbox("Brand", ["All"] + list(available_brands))
         gender = st.selectbox("Gender", ["All", "Female", "Male", "Unisex"])
@@ -775,36 +607,23 @@ def main():
                 selected_category = None if category == "All" else category
                 selected_brand = None if brand == "All" else brand
 
-                # Fetch products based on filters
-                products_df = fetch_makeup_products(selected_category, selected_brand)
-
-                # Apply price and rating filters
-                if not products_df.empty:
-                    # Convert price to numeric
-                    products_df['price'] = pd.to_numeric(products_df['price'], errors='coerce')
-                    # Drop rows where price is NaN
-                    filtered_df = products_df.dropna(subset=['price'])
-
-                    # Apply price filter
-                    price_min, price_max = price_range
-                    filtered_df = filtered_df[
-                        (filtered_df['price'] >= price_min) & (filtered_df['price'] <= price_max)
-                        ]
-
-                    # Apply rating filter if available
-                    if 'rating' in filtered_df.columns:
-                        filtered_df['rating'] = pd.to_numeric(filtered_df['rating'], errors='coerce')
-                        filtered_df = filtered_df[filtered_df['rating'] >= rating_filter]
-
-                    # Sort by rating (if available) or price
-                    if 'rating' in filtered_df.columns and not filtered_df['rating'].isnull().all():
-                        filtered_df = filtered_df.sort_values(by='rating', ascending=False)
-                    else:
-                        filtered_df = filtered_df.sort_values(by='price', ascending=True)
-
-                    # Get top recommendations
-                    recommendations = filtered_df.head(5)
-                    st.session_state['recommendations'] = recommendations
+                # Rank by the user's profile: gender, age group and skin type
+                profile = {
+                    "gender": None if gender == "All" else gender,
+                    "age_group": st.session_state.profile.age_group,
+                    "skin_type": st.session_state.profile.skin_type,
+                }
+
+                # Search results are ranked by relevance, everything else by the profile-weighted score
+                recommendations, _, version = get_core().recommend(selected_category, selected_brand, price_range,
+                                                                   rating_filter, profile, query=search_query)
+
+                if recommendations is not None:
+                    # Sessions keep row ids into the catalog version, not the rows (see session_schema.py)
+                    st.session_state['recommendations'] = (recommendation_ref(recommendations, version)
+                                                           if version is not None else recommendations)
+                    # Start fetching thumbnails while the descriptions are being written
+                    get_thumbnail_cache().prefetch(recommendations['image_link'])
 
                     # Store the category selection for chat bot display logic
                     st.session_state['selected_category'] = category
@@ -812,9 +631,14 @@ def main():
                     st.error("No products found. Try different criteria.")
 
     # --- Main Area: Display Recommendations ---
-    if 'recommendations' in st.session_state:
+    recommendations = session_recommendations()
+    if recommendations is not None:
         st.subheader("✨ Top Product Recommendations Just for You:")
-        display_recommendations(st.session_state['recommendations'], gender)
+        display_recommendations(recommendations, gender)
+        display_similar_products(recommendations, gender)
+    elif 'recommendations' in st.session_state:
+        del st.session_state['recommendations']
+        st.info("The product catalog has been updated. Get your recommendations again to see the latest products.")
     else:
         st.info("Use the sidebar to set your preferences and get personalized beauty product recommendations.")
 
@@ -823,4 +647,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with metrics.timer("script_run"):
+        main()
\ No newline at end of file
@@ -0,0 +1,12 @@
+# UI-free BeautyMate: the recommendation core (core.py), a headless HTTP API over it (api.py) and the
+# catalog, index, cache and client modules they are built from. The Streamlit app (app.py) imports from here.
+
+__all__ = ["BeautyMate"]
+
+
+def __getattr__(name):
+    # Imported on first use, so `python -m beautymate.catalog` does not load the core (and the catalog) first
+    if name == "BeautyMate":
+        from beautymate.core import BeautyMate
+        return BeautyMate
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
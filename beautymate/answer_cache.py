@@ -0,0 +1,124 @@
+import hashlib
+import json
+import re
+import threading
+import zlib
+
+import numpy as np
+
+# Similarity cache for Sofi's answers.
+#
+# Questions are normalized and embedded offline with a hashing vectorizer
+# (word unigrams/bigrams plus character trigrams, so plurals and small typos
+# still land close). A lookup is one matrix-vector product against every
+# stored question for the same gender; the best match above `threshold`
+# returns its cached answer. An answer also depends on the conversation it
+# was given in, so entries are scoped to a hash of those context messages and
+# only match the same context (a fresh question has an empty context). Entries
+# carry the prompt version they were generated with, and the least recently
+# used one is evicted when full.
+
+STOP_WORDS = frozenset(
+    "a an the i me my you your is are am be do does should can could would what which how "
+    "for to of on in with and or any some best good use using get please tips tip".split()
+)
+
+
+def normalize_question(question):
+    words = re.sub(r"[^a-z0-9\s]", " ", question.lower()).split()
+    return [w for w in words if w not in STOP_WORDS] or words
+
+
+def context_key(messages):
+    """Hash of the conversation messages an answer was generated with; "" when there are none."""
+    if not messages:
+        return ""
+    encoded = json.dumps([[m["role"], m["content"]] for m in messages], ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def embed_question(question, dim=4096):
+    vector = np.zeros(dim, dtype=np.float32)
+    words = normalize_question(question)
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    features += [f"c:{w[i:i + 3]}" for w in words for i in range(max(1, len(w) - 2))]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        # Word features weigh more than the character trigrams that back them up
+        weight = 0.5 if feature.startswith("c:") else 1.0
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    def __init__(self, prompt_version, threshold=0.85, capacity=2000, dim=4096):
+        self.prompt_version = prompt_version
+        self.threshold = threshold
+        self.capacity = capacity
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._reset()
+
+    def _reset(self):
+        self.vectors = np.zeros((self.capacity, self.dim), dtype=np.float32)
+        self.genders = np.full(self.capacity, "", dtype=object)
+        self.contexts = np.full(self.capacity, "", dtype=object)
+        self.versions = np.zeros(self.capacity, dtype=np.int64)
+        self.answers = [None] * self.capacity
+        self.used_at = np.zeros(self.capacity, dtype=np.int64)
+        self.size = 0
+        self.clock = 0
+
+    def get(self, question, gender, context=None):
+        vector = embed_question(question, self.dim)
+        context = context_key(context)
+        with self.lock:
+            if self.size:
+                scores = self.vectors[:self.size] @ vector
+                scores[self.genders[:self.size] != gender.lower()] = -1.0
+                scores[self.contexts[:self.size] != context] = -1.0
+                # Answers generated with another prompt version never match
+                scores[self.versions[:self.size] != self.prompt_version] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.clock += 1
+                    self.used_at[best] = self.clock
+                    self.counters["hits"] += 1
+                    return self.answers[best]
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, question, gender, answer, context=None):
+        vector = embed_question(question, self.dim)
+        context = context_key(context)
+        with self.lock:
+            if self.size < self.capacity:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = int(np.argmin(self.used_at))
+                self.counters["evictions"] += 1
+            self.clock += 1
+            self.vectors[slot] = vector
+            self.genders[slot] = gender.lower()
+            self.contexts[slot] = context
+            self.versions[slot] = self.prompt_version
+            self.answers[slot] = answer
+            self.used_at[slot] = self.clock
+
+    def invalidate(self, prompt_version=None):
+        """Drop every cached answer, e.g. because the consultant prompt changed."""
+        with self.lock:
+            if prompt_version is not None:
+                self.prompt_version = prompt_version
+            self._reset()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, entries=self.size, prompt_version=self.prompt_version)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
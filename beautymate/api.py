@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import math
+from contextlib import asynccontextmanager
+
+import uvicorn
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from beautymate.core import BeautyMate, DESCRIPTION_TIMEOUT, fallback_description
+from beautymate import metrics
+
+# Headless HTTP API over the recommendation core, for mobile and batch clients.
+#
+#   python -m beautymate.api --port 8000 --workers 4
+#
+#   POST /recommend  {"category": "lipstick", "brand": null, "price_range": [10, 40], "min_rating": 4,
+#                     "gender": "Female", "age_group": "25-34", "skin_type": "Dry",
+#                     "query": "", "k": 5, "descriptions": true}
+#   POST /ask        {"question": "Which blush suits dry skin?", "gender": "Female", "skin_type": "Dry",
+#                     "history": [{"role": "user", "content": "..."}], "stream": false}
+#   GET  /health, /stats, /metrics
+#
+# Every worker process builds its own BeautyMate at startup; the catalog
+# snapshot and its indexes are memory-mapped and shared between workers, the
+# caches are per worker (the SQLite description cache is shared on disk). Catalog
+# queries are a few hundred microseconds of numpy and run on the event loop;
+# OpenAI calls run on worker threads and are awaited, so a worker keeps
+# serving other requests while descriptions and answers are generated.
+
+load_dotenv()
+
+GENDERS = ("All", "Female", "Male", "Unisex")
+PRODUCT_FIELDS = ("id", "name", "brand", "price", "rating", "product_type", "image_link", "tags")
+MAX_RESULTS = 50
+MAX_QUESTION_CHARS = 1000
+MAX_HISTORY_MESSAGES = 20
+
+
+def _get(body, name, types, default=None):
+    types = types if isinstance(types, tuple) else (types,)
+    value = body.get(name, default)
+    # JSON true/false are bools, which Python also counts as ints
+    if value is not None and (not isinstance(value, types) or (isinstance(value, bool) and bool not in types)):
+        raise HTTPException(400, f"'{name}' has the wrong type")
+    return value
+
+
+async def _body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "request body must be JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(400, "request body must be a JSON object")
+    return body
+
+
+def _gender(body):
+    gender = _get(body, "gender", str, "All")
+    if gender not in GENDERS:
+        raise HTTPException(400, f"'gender' must be one of {', '.join(GENDERS)}")
+    return gender
+
+
+def product_records(products_df):
+    """JSON-ready dicts of the public product fields; NaN becomes null."""
+    columns = [column for column in PRODUCT_FIELDS if column in products_df.columns]
+    records = products_df[columns].to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, float) and math.isnan(value):
+                record[key] = None
+    return records
+
+
+async def describe(core, products, gender):
+    """Descriptions for `products`, awaited without blocking the loop; late ones get the fallback text."""
+    futures = [asyncio.wrap_future(future) for future in core.describe_many(products, gender)]
+    if not futures:
+        return []
+    _, pending = await asyncio.wait(futures, timeout=DESCRIPTION_TIMEOUT)
+    if pending:
+        metrics.inc("llm_fallbacks", len(pending), call="description", reason="api_timeout")
+    return [future.result() if future not in pending else fallback_description(product, gender)
+            for product, future in zip(products, futures)]
+
+
+async def recommend(request):
+    body = await _body(request)
+    gender = _gender(body)
+    price_range = _get(body, "price_range", list, [0, 100])
+    if len(price_range) != 2 or not all(isinstance(p, (int, float)) and not isinstance(p, bool) for p in price_range):
+        raise HTTPException(400, "'price_range' must be [min, max]")
+    k = _get(body, "k", int, 5)
+    if not 1 <= k <= MAX_RESULTS:
+        raise HTTPException(400, f"'k' must be between 1 and {MAX_RESULTS}")
+    profile = {
+        "gender": None if gender == "All" else gender,
+        "age_group": _get(body, "age_group", str),
+        "skin_type": _get(body, "skin_type", str),
+    }
+
+    core = request.app.state.core
+    products_df, path, version = core.recommend(_get(body, "category", str), _get(body, "brand", str), tuple(price_range),
+                                                _get(body, "min_rating", (int, float), 0.0), profile,
+                                                query=_get(body, "query", str, ""), k=k)
+    products = [] if products_df is None else [products_df.iloc[i] for i in range(len(products_df))]
+    records = [] if products_df is None else product_records(products_df)
+    if _get(body, "descriptions", bool, True):
+        for record, description in zip(records, await describe(core, products, gender)):
+            record["description"] = description
+
+    return JSONResponse({"products": records, "path": path, "catalog_version": version})
+
+
+async def ask(request):
+    body = await _body(request)
+    question = (_get(body, "question", str) or "").strip()
+    if not question or len(question) > MAX_QUESTION_CHARS:
+        raise HTTPException(400, f"'question' must be 1 to {MAX_QUESTION_CHARS} characters")
+    history = _get(body, "history", list, [])[-MAX_HISTORY_MESSAGES:]
+    if not all(isinstance(m, dict) and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+               for m in history):
+        raise HTTPException(400, "'history' must be a list of {role: user|assistant, content} messages")
+    history = [{"role": m["role"], "content": m["content"]} for m in history]
+    args = (question, _gender(body), _get(body, "skin_type", str), history)
+
+    core = request.app.state.core
+    if _get(body, "stream", bool, False):
+        # Starlette iterates the (blocking) generator on a worker thread and sends chunks as they arrive
+        return StreamingResponse(core.stream_answer(*args), media_type="text/plain; charset=utf-8")
+    return JSONResponse({"answer": await run_in_threadpool(core.ask, *args)})
+
+
+async def health(request):
+    snapshot = request.app.state.core.provider.current()
+    return JSONResponse({"status": "ok", "catalog_version": snapshot.version if snapshot is not None else None,
+                         "catalog_synced_at": snapshot.synced_at if snapshot is not None else None})
+
+
+async def stats(request):
+    return JSONResponse(request.app.state.core.stats())
+
+
+async def metrics_text(request):
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.core = BeautyMate().start()
+    try:
+        yield
+    finally:
+        app.state.core.stop()
+
+
+app = Starlette(
+    routes=[
+        Route("/recommend", recommend, methods=["POST"]),
+        Route("/ask", ask, methods=["POST"]),
+        Route("/health", health),
+        Route("/stats", stats),
+        Route("/metrics", metrics_text),
+    ],
+    exception_handlers={HTTPException: http_error},
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeautyMate HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own catalog and caches")
+    args = parser.parse_args()
+    uvicorn.run("beautymate.api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
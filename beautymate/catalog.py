@@ -0,0 +1,366 @@
+import fcntl
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import requests
+
+from beautymate.clients import get_catalog_session
+from beautymate import metrics
+from beautymate.ranking import RATING_THEN_PRICE, top_k_frame
+
+# Local, columnar snapshot of the makeup-api catalog.
+#
+# The snapshot is a directory with one float64 .npy file per numeric column,
+# one int32 code array per string column and a single interned string table
+# (offsets into utf-8 bytes) that all string columns point into, so a brand or
+# product type is stored once however many products share it. It is written
+# by `python -m beautymate.catalog sync` and opened read-only with SharedCatalog, which
+# memory-maps every file: all app and API worker processes on a host share
+# the same page-cache copy of the catalog, and a worker only decodes the rows
+# it actually shows. Indexes built over a snapshot are saved next to it
+# (derived/) by the first process that opens it and mapped by all the others.
+#
+# A sync writes the new snapshot beside the old one and holds an exclusive
+# flock on <directory>.snapshot.lock only while it swaps the directories;
+# readers hold it shared while they map the files, so a reader never opens a
+# directory that is halfway through a swap.
+# Files a process has already mapped stay valid after the swap.
+
+CATALOG_URL = os.getenv("BEAUTYMATE_CATALOG_URL", "http://makeup-api.herokuapp.com/api/v1/products.json")
+CATALOG_DIR = os.getenv("BEAUTYMATE_CATALOG_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "catalog"))
+
+NUMERIC_COLUMNS = ["id", "price", "rating"]
+STRING_COLUMNS = ["name", "brand", "product_type", "image_link", "description", "tags"]
+# Layout of the files above, recorded in meta.json; a snapshot in any other layout is re-synced
+SNAPSHOT_FORMAT = 2
+
+
+def normalize_products(products):
+    """Turn raw makeup-api records into a clean DataFrame with the columns the app uses."""
+    df = pd.DataFrame(products)
+    if df.empty:
+        return pd.DataFrame({col: pd.Series(dtype="float64") for col in NUMERIC_COLUMNS} |
+                            {col: pd.Series(dtype="object") for col in STRING_COLUMNS})
+
+    if "id" not in df.columns:
+        df["id"] = np.arange(len(df))
+    if "tags" not in df.columns:
+        tag_lists = df["tag_list"] if "tag_list" in df.columns else pd.Series([[]] * len(df))
+        df["tags"] = [",".join(t.lower() for t in tags) if isinstance(tags, list) else "" for tags in tag_lists]
+
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+    for col in STRING_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+        df[col] = df[col].fillna("").astype(str).str.strip()
+
+    # makeup-api uses "lip_liner" / "nail_polish"; the app uses "lip liner" / "nail polish"
+    df["product_type"] = df["product_type"].str.lower().str.replace("_", " ")
+    df["brand"] = df["brand"].str.lower()
+
+    df = df[df["name"] != ""]
+    return df[NUMERIC_COLUMNS + STRING_COLUMNS].reset_index(drop=True)
+
+
+def _write_strings(path, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(path + ".offsets.npy", offsets)
+    np.save(path + ".data.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def _write_meta(directory, meta):
+    tmp_path = os.path.join(directory, f"meta.json.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+
+@contextmanager
+def catalog_lock(directory=CATALOG_DIR, name="snapshot", shared=False):
+    """Hold flock on the `name` lock file next to `directory` (exclusive unless `shared`) for the block."""
+    path = f"{os.path.abspath(directory)}.{name}.lock"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        if not shared:
+            raise
+        # Read-only location: nobody can replace the snapshot here either
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(df, directory=CATALOG_DIR, etag=None, last_modified=None):
+    """Write a normalized catalog to `directory`, replacing any previous snapshot atomically."""
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    for col in NUMERIC_COLUMNS:
+        np.save(os.path.join(tmp_dir, col + ".npy"), df[col].to_numpy(dtype=np.float64))
+    # Intern every distinct string once; columns store codes into the table
+    table = {}
+    for col in STRING_COLUMNS:
+        codes = [table.setdefault(value, len(table)) for value in df[col].tolist()]
+        np.save(os.path.join(tmp_dir, col + ".codes.npy"), np.asarray(codes, dtype=np.int32))
+    _write_strings(os.path.join(tmp_dir, "strings"), list(table))
+
+    now = time.time()
+    meta = {"format": SNAPSHOT_FORMAT, "rows": len(df), "synced_at": now, "checked_at": now, "source": CATALOG_URL,
+            "etag": etag, "last_modified": last_modified}
+    _write_meta(tmp_dir, meta)
+
+    # Swap the finished snapshot in place so readers never see a half-written one
+    old_dir = f"{directory}.old-{os.getpid()}"
+    with catalog_lock(directory):
+        if os.path.exists(directory):
+            os.rename(directory, old_dir)
+        os.rename(tmp_dir, directory)
+    if os.path.exists(old_dir):
+        # Processes that still map the old files keep their pages until they let go of them
+        shutil.rmtree(old_dir)
+    return meta
+
+class DerivedArrays:
+    """Mixin for indexes that SharedCatalog.indexes() saves under derived/ and memory-maps.
+
+    An index whose state is flat numpy arrays lists them in ARRAYS and is written once per snapshot by
+    the first process that opens it; every other worker process maps the same files instead of building
+    a private copy, so the page cache holds one copy per host. VERSION names the saved layout: bump it
+    whenever ARRAYS or their meaning change, and the next process rebuilds into a new directory.
+    Whatever is not saved is rebuilt from the catalog in _restore().
+    """
+
+    VERSION = 1
+    ARRAYS = ()
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays, catalog):
+        """An index over a SharedCatalog from previously saved arrays()."""
+        index = cls.__new__(cls)
+        index.__dict__.update(arrays)
+        index._restore(catalog)
+        return index
+
+    def _restore(self, catalog):
+        pass
+
+
+class SharedCatalog:
+    """Read-only, memory-mapped view of a snapshot directory (see the header comment)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Identifies this snapshot: a swap puts a different directory at the same path
+        self.inode = os.stat(directory).st_ino
+        self.meta = snapshot_info(directory) or {}
+        self.numeric = {col: np.load(os.path.join(directory, col + ".npy"), mmap_mode="r") for col in NUMERIC_COLUMNS}
+        self.codes = {col: np.load(os.path.join(directory, col + ".codes.npy"), mmap_mode="r") for col in STRING_COLUMNS}
+        self.string_offsets = np.load(os.path.join(directory, "strings.offsets.npy"), mmap_mode="r")
+        self.string_data = np.load(os.path.join(directory, "strings.data.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.numeric["id"])
+
+    @property
+    def columns(self):
+        return NUMERIC_COLUMNS + STRING_COLUMNS
+
+    def strings(self, codes):
+        """Decode string-table entries one by one; for the handful of rows a page shows."""
+        offsets, data = self.string_offsets, self.string_data
+        return [bytes(data[offsets[code]:offsets[code + 1]]).decode("utf-8") for code in codes.tolist()]
+
+    def take(self, row_ids):
+        """The given rows as a small DataFrame, indexed by row id like DataFrame.take/iloc."""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        # Plain ndarrays (not memmap views) and columns already in order keep the DataFrame build cheap
+        columns = {col: np.asarray(self.numeric[col][row_ids]) for col in NUMERIC_COLUMNS}
+        for col in STRING_COLUMNS:
+            columns[col] = self.strings(self.codes[col][row_ids])
+        return pd.DataFrame(columns, index=pd.Index(row_ids), copy=False)
+
+    def frame(self):
+        """The whole catalog decoded into a DataFrame - a private copy, only for building indexes and benchmarks."""
+        raw, bounds = self.string_data.tobytes(), self.string_offsets.tolist()
+        table = [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+        columns = {col: np.array(self.numeric[col]) for col in NUMERIC_COLUMNS}
+        for col in STRING_COLUMNS:
+            # Rows sharing a string share one str object
+            columns[col] = [table[code] for code in self.codes[col].tolist()]
+        return pd.DataFrame(columns)
+
+    def indexes(self, *classes):
+        """One index per class, mapped from the snapshot's derived/ directory, building and saving any that are missing.
+
+        Each class is a DerivedArrays built from the decoded frame; the frame is only decoded when some
+        index is missing.
+        """
+        frame = None
+        built = []
+        with catalog_lock(self.directory, shared=True):
+            # After a swap the path holds a newer snapshot whose derived/ does not match these rows
+            current = self._is_current()
+            for cls in classes:
+                path = os.path.join(self.directory, "derived", f"{cls.__name__}-{cls.VERSION}")
+                if not current or not os.path.isdir(path):
+                    frame = self.frame() if frame is None else frame
+                    index = cls(frame)
+                    try:
+                        if not current:
+                            raise FileNotFoundError(self.directory)
+                        _save_arrays(path, index.arrays())
+                    except OSError:
+                        # Read-only or replaced snapshot directory: keep this process's private copy
+                        built.append(index)
+                        continue
+                arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in cls.ARRAYS}
+                built.append(cls.from_arrays(arrays, self))
+        return built
+
+    def _is_current(self):
+        try:
+            return os.stat(self.directory).st_ino == self.inode
+        except OSError:
+            return False
+
+
+def _save_arrays(path, arrays):
+    tmp_dir = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    try:
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Another process saved the same index first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def open_catalog(directory=CATALOG_DIR):
+    """Attach to the on-disk snapshot as a SharedCatalog, or return None if no snapshot has been synced."""
+    with catalog_lock(directory, shared=True):
+        return SharedCatalog(directory) if snapshot_info(directory) is not None else None
+
+
+def load_catalog(directory=CATALOG_DIR):
+    """Load the on-disk snapshot as a DataFrame, or return None if no snapshot has been synced."""
+    catalog = open_catalog(directory)
+    return catalog.frame() if catalog is not None else None
+
+
+def snapshot_info(directory=CATALOG_DIR):
+    """The snapshot's meta.json, or None if there is no snapshot in SNAPSHOT_FORMAT (the next sync writes one)."""
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return info if info.get("format") == SNAPSHOT_FORMAT else None
+
+
+def sync_catalog(directory=CATALOG_DIR, timeout=60, conditional=False, url=None):
+    """Download the full makeup-api catalog and store it as a local snapshot.
+
+    With `conditional`, the request carries the snapshot's ETag/Last-Modified and returns None
+    (after marking the snapshot as checked) when the server says nothing changed.
+    """
+    headers = {}
+    info = snapshot_info(directory) if conditional else None
+    if info:
+        if info.get("etag"):
+            headers["If-None-Match"] = info["etag"]
+        if info.get("last_modified"):
+            headers["If-Modified-Since"] = info["last_modified"]
+
+    with metrics.timer("catalog_fetch"):
+        response = get_catalog_session().get(url or CATALOG_URL, headers=headers, timeout=timeout)
+    if response.status_code == 304 and info:
+        with catalog_lock(directory):
+            # Re-read under the lock so a snapshot another process just wrote keeps its own metadata
+            current = snapshot_info(directory)
+            if current is not None and current.get("synced_at") == info.get("synced_at"):
+                _write_meta(directory, dict(current, checked_at=time.time()))
+        return None
+    response.raise_for_status()
+    df = normalize_products(response.json())
+    if df.empty:
+        raise ValueError("makeup-api returned an empty catalog")
+    return write_snapshot(df, directory, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+
+def filter_catalog(df, category=None, brand=None):
+    mask = np.ones(len(df), dtype=bool)
+    if category:
+        mask &= (df["product_type"] == category.lower()).to_numpy()
+    if brand:
+        mask &= (df["brand"] == brand.lower()).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def rank_products(products_df, price_range, min_rating, k=5, profile=None):
+    """Price/rating filter over a product DataFrame, returning the top `k` rows by rating then price.
+
+    With a `profile` (ProductScorer.profile_vector arguments) rows are ranked by personalized score first.
+    """
+    # Convert price to numeric and drop rows where price is NaN
+    products_df = products_df.assign(price=pd.to_numeric(products_df['price'], errors='coerce'))
+    filtered_df = products_df.dropna(subset=['price'])
+
+    price_min, price_max = price_range
+    filtered_df = filtered_df[(filtered_df['price'] >= price_min) & (filtered_df['price'] <= price_max)]
+
+    # Apply rating filter if available
+    if 'rating' in filtered_df.columns:
+        filtered_df = filtered_df.assign(rating=pd.to_numeric(filtered_df['rating'], errors='coerce'))
+        filtered_df = filtered_df[filtered_df['rating'] >= min_rating]
+
+    keys = RATING_THEN_PRICE
+    if profile is not None:
+        from beautymate.scoring import ProductScorer  # scoring imports this module for DerivedArrays
+        filtered_df = filtered_df.assign(score=ProductScorer(filtered_df).score_profile(**profile))
+        keys = (("score", True),) + keys
+
+    # Best rating first (if available), cheapest first among ties - partial selection, no full sort
+    return filtered_df.iloc[top_k_frame(filtered_df, k, keys)]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "sync"
+    if command == "sync":
+        started = time.perf_counter()
+        try:
+            meta = sync_catalog()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Catalog sync failed: {e}")
+            sys.exit(1)
+        print(f"Synced {meta['rows']} products to {CATALOG_DIR} in {time.perf_counter() - started:.1f}s")
+    elif command == "info":
+        print(json.dumps(snapshot_info(), indent=2))
+    else:
+        print("usage: python -m beautymate.catalog [sync|info]")
+        sys.exit(1)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from beautymate.catalog import DerivedArrays
+from beautymate.ranking import top_k
+
+# Query index over a normalized catalog (see catalog.normalize_products).
+#
+# Built once per catalog version: posting lists of sorted row ids per
+# product_type and brand, plus price- and rating-sorted permutations. A
+# recommendation query is then a posting-list intersection, two binary-search
+# range cuts and a top-k pick instead of a pandas filter/sort chain over the
+# whole catalog. Everything is a flat numpy array (postings are CSR: sorted
+# keys, offsets, row ids).
+
+
+def _postings(values):
+    """(sorted distinct keys, offsets, row ids grouped by key and ascending within each key)."""
+    codes, keys = pd.factorize(values.fillna(""), sort=True)
+    ids = np.argsort(codes, kind="stable")
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(keys)), out=offsets[1:])
+    return np.asarray(keys, dtype=str), offsets, ids.astype(np.int64)
+
+
+class CatalogIndex(DerivedArrays):
+    ARRAYS = ("category_keys", "category_offsets", "category_ids", "brand_keys", "brand_offsets", "brand_ids",
+              "price_order", "sorted_price", "rating_order", "sorted_rating")
+
+    def __init__(self, products):
+        self.category_keys, self.category_offsets, self.category_ids = _postings(products["product_type"].str.lower())
+        self.brand_keys, self.brand_offsets, self.brand_ids = _postings(products["brand"].str.lower())
+
+        price = products["price"].to_numpy(dtype=np.float64)
+        rating = products["rating"].to_numpy(dtype=np.float64)
+        # argsort puts NaN last, so the valid prefix of each permutation is binary-searchable
+        self.price_order = np.argsort(price, kind="stable")
+        self.sorted_price = price[self.price_order][:np.count_nonzero(~np.isnan(price))]
+        self.rating_order = np.argsort(rating, kind="stable")
+        self.sorted_rating = rating[self.rating_order][:np.count_nonzero(~np.isnan(rating))]
+        self._attach(products, price, rating)
+
+    def _attach(self, products, price, rating):
+        self.products = products
+        self.size = len(products)
+        self.price = price
+        self.rating = rating
+        self.rank_keys = [(self.rating, True), (self.price, False)]
+
+    def _restore(self, catalog):
+        # Price and rating are the catalog's own columns
+        self._attach(catalog, catalog.numeric["price"], catalog.numeric["rating"])
+
+    def _postings(self, field, key):
+        keys = getattr(self, field + "_keys")
+        i = np.searchsorted(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return None
+        offsets = getattr(self, field + "_offsets")
+        return getattr(self, field + "_ids")[offsets[i]:offsets[i + 1]]
+
+    def match(self, category=None, brand=None):
+        """Sorted row ids for a category/brand selection, or None when either is unknown to the catalog."""
+        candidates = None
+        for field, key in (("category", category), ("brand", brand)):
+            if not key:
+                continue
+            ids = self._postings(field, key.lower())
+            if ids is None:
+                return None
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        return np.arange(self.size) if candidates is None else candidates
+
+    def _cut(self, candidates, order, sorted_values, values, low, high):
+        start = np.searchsorted(sorted_values, low, side="left")
+        end = np.searchsorted(sorted_values, high, side="right")
+        # Small candidate sets are cheaper to check directly than to intersect with the range
+        if len(candidates) <= end - start:
+            selected = values[candidates]
+            return candidates[(selected >= low) & (selected <= high)]
+        return np.intersect1d(candidates, order[start:end])
+
+    def query(self, category=None, brand=None, price_range=(0, np.inf), min_rating=0.0, k=5, scores=None, within=None):
+        """Row ids of the top `k` products (rating desc, then price asc), or None if the catalog has no such category/brand.
+
+        With `scores` (one per catalog row, e.g. from scoring.ProductScorer) the highest score ranks first instead.
+        `within` restricts the result to a sorted array of row ids, e.g. full-text search matches.
+        """
+        candidates = self.match(category, brand)
+        if candidates is None:
+            return None
+        if within is not None:
+            candidates = np.intersect1d(candidates, within, assume_unique=True)
+        price_min, price_max = price_range
+        candidates = self._cut(candidates, self.price_order, self.sorted_price, self.price, price_min, price_max)
+        candidates = self._cut(candidates, self.rating_order, self.sorted_rating, self.rating, min_rating, np.inf)
+        keys = self.rank_keys if scores is None else [(scores, True)] + self.rank_keys
+        return top_k(candidates, keys, k)
+
+    def take(self, row_ids):
+        # DataFrame.take and SharedCatalog.take both keep the row ids as the index
+        return self.products.take(row_ids)
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+from beautymate.catalog import CATALOG_DIR, catalog_lock, open_catalog, snapshot_info, sync_catalog
+from beautymate.catalog_index import CatalogIndex
+from beautymate import metrics
+from beautymate.scoring import ProductScorer
+from beautymate.search import SearchIndex
+from beautymate.similarity import SimilarityIndex
+
+# Stale-while-revalidate access to the catalog snapshot.
+#
+# current() always returns the last good snapshot immediately. A daemon thread
+# re-checks makeup-api every `interval` seconds with a conditional request;
+# when the catalog changed it writes a new snapshot, builds its index off to
+# the side and then swaps a single reference, so sessions in flight keep the
+# snapshot they started with and never see a half-loaded one. The products and
+# every index are memory-mapped from the snapshot directory (see
+# catalog.SharedCatalog), so worker processes share one copy of them. The
+# last few snapshots stay reachable by version, for sessions that keep row
+# ids into the snapshot their recommendations came from.
+#
+# Every worker process runs its own provider over the same directory. Only
+# one of them talks to makeup-api at a time (flock on <directory>.sync.lock);
+# on each tick the others compare meta.json with the snapshot they loaded and
+# reload when another process wrote a newer one.
+
+CATALOG_REFRESH_SECONDS = float(os.getenv("BEAUTYMATE_CATALOG_REFRESH", 6 * 3600))
+# Snapshots kept addressable by version, the current one included
+CATALOG_VERSIONS_KEPT = 3
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["products", "index", "scorer", "similarity", "search", "version", "synced_at"])
+
+
+class CatalogProvider:
+    def __init__(self, directory=CATALOG_DIR, interval=CATALOG_REFRESH_SECONDS, url=None):
+        self.directory = directory
+        self.interval = interval
+        # makeup-api products URL; None means catalog.CATALOG_URL
+        self.url = url
+        self._snapshot = None
+        self._versions = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._refresh_lock = threading.Lock()
+        self.counters = {"refreshes": 0, "updated": 0, "not_modified": 0, "skipped": 0, "failures": 0}
+        self.last_refresh_seconds = None
+        self.last_error = None
+        self._load()
+
+    def _load(self):
+        products = open_catalog(self.directory)
+        if products is None:
+            return False
+        version = (self._snapshot.version + 1) if self._snapshot else 1
+        # Build (or map) everything first, then publish with one reference assignment
+        index, scorer, similarity, search = products.indexes(CatalogIndex, ProductScorer, SimilarityIndex, SearchIndex)
+        self._snapshot = CatalogSnapshot(products, index, scorer, similarity, search, version, products.meta.get("synced_at"))
+        self._versions[version] = self._snapshot
+        self._versions.pop(version - CATALOG_VERSIONS_KEPT, None)
+        return True
+
+    def current(self):
+        """The latest complete snapshot, or None if no catalog has ever been synced."""
+        return self._snapshot
+
+    def snapshot(self, version):
+        """The snapshot with this version, or None once it has been dropped (see CATALOG_VERSIONS_KEPT)."""
+        return self._versions.get(version)
+
+    def _changed_on_disk(self):
+        info = snapshot_info(self.directory)
+        if info is None:
+            return False
+        return self._snapshot is None or info.get("synced_at") != self._snapshot.synced_at
+
+    def refresh(self, if_due=False):
+        """Check makeup-api for a newer catalog and swap it in. Returns True if the catalog changed.
+
+        With `if_due`, skip the request when another process checked while this one waited for the sync lock.
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            self.counters["refreshes"] += 1
+            try:
+                meta = None
+                with catalog_lock(self.directory, "sync"):
+                    if not if_due or self._seconds_until_due() == 0:
+                        meta = sync_catalog(self.directory, conditional=True, url=self.url)
+                        if meta is None:
+                            self.counters["not_modified"] += 1
+                    else:
+                        self.counters["skipped"] += 1
+                self.last_error = None
+                # A 304 or a skipped check can still find a snapshot another process wrote
+                if meta is None and not self._changed_on_disk():
+                    return False
+                self._load()
+                self.counters["updated"] += 1
+                return True
+            except (requests.RequestException, ValueError, OSError) as e:
+                # Keep serving the last good snapshot
+                self.counters["failures"] += 1
+                self.last_error = str(e)
+                return False
+            finally:
+                self.last_refresh_seconds = time.perf_counter() - started
+                metrics.observe("catalog_refresh", self.last_refresh_seconds)
+
+    def _seconds_until_due(self):
+        info = snapshot_info(self.directory)
+        if not info:
+            return 0
+        return max(0.0, info.get("checked_at", info.get("synced_at", 0)) + self.interval - time.time())
+
+    def _run(self):
+        while not self._stop.wait(self._seconds_until_due()):
+            self.refresh(if_due=True)
+            if self.last_error is not None:
+                # Back off after a failed refresh instead of retrying in a tight loop
+                self._stop.wait(min(self.interval, 300))
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        info = snapshot_info(self.directory) or {}
+        checked_at = info.get("checked_at", info.get("synced_at"))
+        snapshot = self._snapshot
+        return dict(
+            self.counters,
+            version=snapshot.version if snapshot else 0,
+            rows=len(snapshot.products) if snapshot else 0,
+            last_refresh_seconds=self.last_refresh_seconds,
+            staleness_seconds=time.time() - checked_at if checked_at else None,
+            last_error=self.last_error,
+        )
@@ -0,0 +1,125 @@
+import os
+import threading
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Process-wide HTTP clients.
+#
+# One OpenAI client backed by a pooled keep-alive httpx client, one
+# requests.Session with retry/backoff for makeup-api and one for product
+# images. Every session, worker
+# thread and helper module shares them, so repeat calls reuse open TLS
+# connections instead of handshaking again.
+
+OPENAI_MAX_CONNECTIONS = 20
+OPENAI_KEEPALIVE_SECONDS = 60
+
+_lock = threading.Lock()
+_openai_client = None
+_catalog_session = None
+_image_session = None
+
+_counters = {"openai_requests": 0, "openai_connections": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _trace_connections(event_name, info):
+    # httpcore reports a TCP connect only when it has to open a new connection
+    if event_name == "connection.connect_tcp.complete":
+        _count("openai_connections")
+
+
+def _on_openai_request(request):
+    _count("openai_requests")
+    request.extensions["trace"] = _trace_connections
+
+
+def openai_configured():
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+
+def get_openai_client():
+    """The shared OpenAI client. Raises the same errors as openai.OpenAI(), e.g. when no API key is set."""
+    global _openai_client
+    if _openai_client is None:
+        # Fail fast: building the pooled HTTP client (SSL context etc.) is the expensive part
+        if not openai_configured():
+            raise openai.OpenAIError("The api_key client option must be set either by passing api_key to the client or by setting the OPENAI_API_KEY environment variable")
+        with _lock:
+            if _openai_client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                        keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                    ),
+                    event_hooks={"request": [_on_openai_request]},
+                )
+                try:
+                    _openai_client = openai.OpenAI(http_client=http_client)
+                except Exception:
+                    http_client.close()
+                    raise
+    return _openai_client
+
+
+def get_catalog_session():
+    """The shared requests.Session for makeup-api, retrying connection errors and 5xx with backoff."""
+    global _catalog_session
+    if _catalog_session is None:
+        with _lock:
+            if _catalog_session is None:
+                retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=("GET", "HEAD"))
+                session = requests.Session()
+                adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _catalog_session = session
+    return _catalog_session
+
+
+def get_image_session():
+    """The shared requests.Session for product images; one quick retry, since a card can always show the original URL."""
+    global _image_session
+    if _image_session is None:
+        with _lock:
+            if _image_session is None:
+                retry = Retry(total=1, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+                session = requests.Session()
+                adapter = HTTPAdapter(max_retries=retry, pool_connections=8, pool_maxsize=8)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _image_session = session
+    return _image_session
+
+
+def connection_stats():
+    """Request and new-connection counts per client; reuse is the share of requests served on an open connection."""
+    with _counters_lock:
+        stats = dict(_counters)
+
+    catalog_requests = catalog_connections = 0
+    if _catalog_session is not None:
+        for adapter in {id(a): a for a in _catalog_session.adapters.values()}.values():
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    catalog_requests += pool.num_requests
+                    catalog_connections += pool.num_connections
+    stats["catalog_requests"] = catalog_requests
+    stats["catalog_connections"] = catalog_connections
+
+    for name in ("openai", "catalog"):
+        requests_made = stats[f"{name}_requests"]
+        stats[f"{name}_connection_reuse"] = 1 - stats[f"{name}_connections"] / requests_made if requests_made else 0.0
+    return stats
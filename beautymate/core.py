@@ -0,0 +1,455 @@
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
+
+import httpx
+import openai
+
+from beautymate.answer_cache import SemanticCache
+from beautymate.catalog import rank_products
+from beautymate.catalog_index import CatalogIndex
+from beautymate.catalog_provider import CatalogProvider
+from beautymate.clients import get_openai_client, openai_configured
+from beautymate.intents import ENGINE as INTENT_ENGINE
+from beautymate.llm_cache import ResponseCache, cache_key
+from beautymate import metrics
+from beautymate.sample_catalog import SAMPLE_CATALOG
+from beautymate.search import SearchIndex
+from beautymate.similarity import SimilarityIndex
+from beautymate.single_flight import SingleFlight
+
+# The recommendation core, free of any UI.
+#
+# BeautyMate owns everything shared between requests - the catalog provider
+# and its indexes, the description and answer caches, the single-flight
+# tables and the worker pool for OpenAI calls - and exposes catalog queries,
+# ranking, descriptions and the consultant as plain methods. The Streamlit
+# app keeps one instance per process (st.cache_resource); the HTTP API
+# (beautymate/api.py) keeps one per worker process.
+
+DESCRIPTION_MODEL = "gpt-3.5-turbo"
+# Bump whenever the description prompt changes so cached descriptions are regenerated
+DESCRIPTION_PROMPT_VERSION = 1
+# Seconds to wait for a single description, and how many are generated at once
+DESCRIPTION_TIMEOUT = 8
+DESCRIPTION_CONCURRENCY = 5
+# "parallel": one OpenAI call per card; "batch": one call for the whole page, per-card calls only for failures
+DESCRIPTION_MODE = os.getenv("BEAUTYMATE_DESCRIPTION_MODE", "parallel")
+
+# Catalog version of the built-in sample catalog; snapshot versions count from 1
+SAMPLE_VERSION = 0
+
+CONSULTANT_MODEL = "gpt-3.5-turbo"
+# Seconds to wait for the answer to start, and between streamed chunks once it has
+CONSULTANT_TIMEOUT = 10
+# Bump whenever Sofi's prompt changes; a new version starts with an empty answer cache
+CONSULTANT_PROMPT_VERSION = 1
+
+
+def description_cache_key(product, gender):
+    return cache_key(
+        product.get('name', 'Product'), product.get('brand', 'Brand'), product.get('product_type', 'Beauty Product'),
+        product.get('price', '0.00'), product.get('rating', 0), gender, DESCRIPTION_MODEL, DESCRIPTION_PROMPT_VERSION
+    )
+
+
+# Low-cardinality label for why an OpenAI call fell back
+def fallback_reason(error):
+    # A stream that stalls mid-answer raises httpx's own timeout, not the SDK's
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException, TimeoutError)):
+        return "timeout"
+    if not openai_configured():
+        return "offline"
+    return "error"
+
+
+# More detailed fallback descriptions based on product type and gender
+def fallback_description(product, gender):
+    product_type = product.get('product_type', '').lower()
+
+    if product_type == "foundation":
+        return f"This foundation provides flawless coverage while letting your skin breathe. Perfect for {gender.lower()} users looking for a natural finish that lasts all day."
+    elif product_type == "lipstick":
+        return f"This richly pigmented lipstick offers vibrant color and moisturizing comfort. Specially formulated to complement {gender.lower()} users with long-lasting, crease-resistant wear."
+    elif product_type == "mascara":
+        return f"Achieve dramatic lashes with this volumizing and lengthening mascara. Designed for {gender.lower()} users who want smudge-proof definition that lasts from day to night."
+    else:
+        return f"This premium {product_type} delivers professional-quality results with every use. Specially formulated for {gender.lower()} users with high-performance ingredients for outstanding results."
+
+
+# The catalog's own description, shortened for a card; used where an OpenAI call isn't worth it
+def short_description(product, gender, limit=200):
+    description = " ".join(str(product.get('description', '')).split())
+    if not description:
+        return fallback_description(product, gender)
+    return description if len(description) <= limit else description[:limit].rsplit(" ", 1)[0] + "..."
+
+
+# Pull {id: description} out of a batch reply, keeping only well-formed entries for ids 1..count
+def parse_batch_descriptions(content, count):
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}
+
+    entries = data.get("descriptions", []) if isinstance(data, dict) else data
+    descriptions = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        product_id, description = entry.get("id"), entry.get("description")
+        if isinstance(product_id, int) and 1 <= product_id <= count and isinstance(description, str) and description.strip():
+            descriptions[product_id] = description.strip()
+    return descriptions
+
+
+# Beauty consultant response using the offline intent engine when OpenAI is unavailable
+def offline_consultant_response(user_question, gender, skin_type=None):
+    return INTENT_ENGINE.respond(user_question, gender, skin_type, mode="offline")
+
+
+# Fall back to the keyword-based system if API fails
+def fallback_consultant_response(user_question, gender, skin_type=None):
+    return INTENT_ENGINE.respond(user_question, gender, skin_type, mode="fallback")
+
+
+class BeautyMate:
+    def __init__(self, provider=None, description_cache=None, answer_cache=None):
+        # The catalog snapshot (written by `python -m beautymate.catalog sync`) with its indexes; call start() to refresh it
+        # from makeup-api in the background. Callers always get the last good snapshot instantly.
+        self.provider = provider if provider is not None else CatalogProvider()
+        # Generated descriptions, persisted across restarts, and answers to previously asked (or similar) questions
+        self.description_cache = description_cache if description_cache is not None else ResponseCache()
+        self.answer_cache = answer_cache if answer_cache is not None else SemanticCache(CONSULTANT_PROMPT_VERSION)
+        # Worker threads for generating descriptions, to cap concurrent OpenAI calls
+        self.description_executor = ThreadPoolExecutor(max_workers=DESCRIPTION_CONCURRENCY, thread_name_prefix="descriptions")
+        # In-flight catalog queries and description prompts, so identical concurrent requests run once;
+        # stats() counts how many callers were coalesced onto another caller's request
+        self.catalog_flight = SingleFlight()
+        self.description_flight = SingleFlight()
+
+    def start(self):
+        self.provider.start()
+        return self
+
+    def stop(self):
+        self.provider.stop()
+        self.description_executor.shutdown(wait=False)
+
+    # --- Catalog ---
+
+    # Serve products from the local catalog snapshot, falling back to sample data - never hits the network
+    def products(self, category=None, brand=None):
+        return self._products(self.provider.current(), category, brand)[0]
+
+    # (products, catalog version their index labels are row ids of - None for made-up sample products)
+    def _products(self, snapshot, category=None, brand=None):
+        if snapshot is not None:
+            row_ids = snapshot.index.match(category, brand)
+            if row_ids is not None and len(row_ids):
+                # Callers asking for the same category/brand of the same snapshot share one decode of its rows
+                with metrics.timer("catalog_query"):
+                    return self.catalog_flight.do((snapshot.version, category, brand), snapshot.index.take, row_ids), snapshot.version
+
+        # No snapshot yet, or nothing in it for this request
+        metrics.inc("catalog_fallbacks", reason="no_snapshot" if snapshot is None else "no_match")
+        return self.sample_products(category), SAMPLE_VERSION if SAMPLE_CATALOG.covers(category) else None
+
+    # Sample products for a category, served from the prebuilt sample catalog (shared frames - don't mutate)
+    def sample_products(self, category=None):
+        return SAMPLE_CATALOG.products_for(category)
+
+    # Full-text and filter indexes over the sample catalog, used for search when no snapshot has been synced
+    @cached_property
+    def sample_search(self):
+        return SearchIndex(SAMPLE_CATALOG.products), CatalogIndex(SAMPLE_CATALOG.products)
+
+    # Nearest-neighbour index over the sample catalog, for recommendations that came from the sample data
+    @cached_property
+    def sample_similarity(self):
+        return SimilarityIndex(SAMPLE_CATALOG.products)
+
+    def recommend(self, category=None, brand=None, price_range=(0, 100), min_rating=0.0, profile=None, query="", k=5):
+        """(top-k products or None, path that answered, catalog version) for the given filters, ranked by the user's profile.
+
+        The products' index holds their row ids in that catalog version, so callers can keep just the ids and get
+        the rows back with rows(); the version is None for products that only exist in this result.
+        """
+        profile = profile or {}
+        started = time.perf_counter()
+        snapshot = self.provider.current()
+        version = snapshot.version if snapshot is not None else SAMPLE_VERSION
+        if query.strip():
+            # Search results are ranked by relevance within the filters
+            recommendations = self._search(snapshot, query, category, brand, price_range, min_rating, k)
+            path = "search"
+        else:
+            # Answer from the catalog index when the snapshot covers this category/brand
+            index = snapshot.index if snapshot is not None else None
+            row_ids = None
+            if index is not None:
+                scores = snapshot.scorer.score_profile(**profile)
+                row_ids = index.query(category, brand, price_range, min_rating, k=k, scores=scores)
+
+            if row_ids is not None:
+                recommendations = index.take(row_ids)
+                path = "index"
+            else:
+                # Fetch products based on filters and apply price and rating filters
+                products_df, version = self._products(snapshot, category, brand)
+                recommendations = rank_products(products_df, price_range, min_rating, k=k, profile=profile) if not products_df.empty else None
+                path = "fallback"
+        metrics.observe("recommend", time.perf_counter() - started, path=path)
+        return recommendations, path, version
+
+    # Products by row id in catalog `version` (see recommend); None once that snapshot is no longer kept
+    def rows(self, version, row_ids):
+        if version == SAMPLE_VERSION:
+            return SAMPLE_CATALOG.products.take(row_ids)
+        snapshot = self.provider.snapshot(version)
+        return snapshot.products.take(row_ids) if snapshot is not None else None
+
+    # Free-text search combined with the category/brand selection and the price and rating filters.
+    # Everything up to the final top-k is done on row-id arrays; only the k results become a DataFrame.
+    def search(self, query, category=None, brand=None, price_range=(0, 100), min_rating=0.0, k=5):
+        return self._search(self.provider.current(), query, category, brand, price_range, min_rating, k)
+
+    def _search(self, snapshot, query, category, brand, price_range, min_rating, k):
+        search, index = (snapshot.search, snapshot.index) if snapshot is not None else self.sample_search
+        row_ids, scores = search.search(query)
+        if not len(row_ids):
+            return None
+        row_ids = index.query(category, brand, price_range, min_rating, k=k, scores=scores, within=row_ids)
+        return index.take(row_ids) if row_ids is not None and len(row_ids) else None
+
+    # Products most like `product`, from whichever catalog it belongs to; None when it is in neither
+    def similar(self, product, k=4):
+        snapshot = self.provider.current()
+        for similarity in (snapshot.similarity if snapshot is not None else None, self.sample_similarity):
+            row = similarity.row_of(product) if similarity is not None else None
+            if row is not None:
+                return similarity.take(similarity.similar(row, k))
+        return None
+
+    # --- Descriptions ---
+
+    # Generate personalized description using OpenAI
+    def describe(self, product, gender, cache=None):
+        cache = cache if cache is not None else self.description_cache
+        key = description_cache_key(product, gender)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        return self.description_flight.do(key, self._request_description, product, gender, cache, key)
+
+    # Start generating descriptions for a page of products at once; cached ones come back already done
+    def describe_many(self, products, gender):
+        cache = self.description_cache
+        futures = []
+        missing = []
+        for product in products:
+            key = description_cache_key(product, gender)
+            cached = cache.get(key)
+            future = Future()
+            if cached is not None:
+                future.set_result(cached)
+            elif not openai_configured():
+                # Offline: the template text is instant, no need for a worker thread
+                future.set_result(self._request_description(product, gender, cache, key))
+            elif DESCRIPTION_MODE == "batch":
+                # Join a prompt another caller already has in flight; only claimed keys go into our batch
+                future, leader = self.description_flight.claim(key)
+                if leader:
+                    missing.append((product, key, future))
+            else:
+                future = self.description_flight.submit(key, self.description_executor, self._request_description,
+                                                        product, gender, cache, key)
+            futures.append(future)
+
+        if missing:
+            self.description_executor.submit(self._request_description_batch, missing, gender, cache)
+        return futures
+
+    # Ask OpenAI for a description and store it in the cache under `key`. Runs on worker threads too.
+    def _request_description(self, product, gender, cache, key):
+        try:
+            # Raises without an API key; the handler below returns the template description
+            client = get_openai_client()
+
+            product_name = product.get('name', 'Product')
+            brand = product.get('brand', 'Brand')
+            category = product.get('product_type', 'Beauty Product')
+            price = product.get('price', '0.00')
+            rating = product.get('rating', 0)
+
+            prompt = f"""
+            Create a compelling 3-sentence product description for a beauty recommendation system.
+            Product: {product_name}
+            Brand: {brand}
+            Category: {category}
+            Price: ${price}
+            Rating: {rating}/5
+            Gender: {gender}
+
+            Focus on why this product is perfect for {gender} users.
+            Highlight its key benefits. Keep it professional but engaging.
+            """
+            with metrics.timer("llm_call", call="description"):
+                response = client.chat.completions.create(
+                    model=DESCRIPTION_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a helpful beauty product recommendation assistant."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=150,
+                    timeout=DESCRIPTION_TIMEOUT
+                )
+            description = response.choices[0].message.content.strip()
+            cache.set(key, description)
+            return description
+        except Exception as e:
+            metrics.inc("llm_fallbacks", call="description", reason=fallback_reason(e))
+            return fallback_description(product, gender)
+
+    # Ask for every missing description in a single chat completion and resolve each card's future.
+    # Items the model skips or garbles are retried with a per-product call. Runs on a worker thread.
+    def _request_description_batch(self, items, gender, cache):
+        descriptions = {}
+        try:
+            if len(items) > 1:
+                client = get_openai_client()
+                product_lines = "\n".join(
+                    f"{i}. Product: {product.get('name', 'Product')} | Brand: {product.get('brand', 'Brand')} | "
+                    f"Category: {product.get('product_type', 'Beauty Product')} | Price: ${product.get('price', '0.00')} | "
+                    f"Rating: {product.get('rating', 0)}/5"
+                    for i, (product, _, _) in enumerate(items, start=1)
+                )
+                prompt = f"""
+                Create a compelling 3-sentence product description for each product below, for a beauty recommendation system.
+                Gender: {gender}
+
+                {product_lines}
+
+                Focus on why each product is perfect for {gender} users.
+                Highlight its key benefits. Keep it professional but engaging.
+                Reply with JSON only, in the form {{"descriptions": [{{"id": 1, "description": "..."}}]}}, one entry per product.
+                """
+                with metrics.timer("llm_call", call="description_batch"):
+                    response = client.chat.completions.create(
+                        model=DESCRIPTION_MODEL,
+                        messages=[
+                            {"role": "system", "content": "You are a helpful beauty product recommendation assistant."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.7,
+                        max_tokens=150 * len(items),
+                        response_format={"type": "json_object"},
+                        timeout=DESCRIPTION_TIMEOUT
+                    )
+                descriptions = parse_batch_descriptions(response.choices[0].message.content, len(items))
+        except Exception as e:
+            metrics.inc("llm_fallbacks", call="description_batch", reason=fallback_reason(e))
+
+        # Products the batch didn't answer fall back to one call each
+        metrics.inc("description_batch_retries", len(items) - len(descriptions))
+
+        for i, (product, key, future) in enumerate(items, start=1):
+            if i in descriptions:
+                cache.set(key, descriptions[i])
+                future.set_result(descriptions[i])
+            else:
+                retry = self.description_executor.submit(self._request_description, product, gender, cache, key)
+                retry.add_done_callback(lambda done, future=future: future.set_result(done.result()))
+
+    # --- Consultant ---
+
+    # Stream Sofi's answer as text chunks as they arrive; the keyword fallbacks yield their whole answer at once
+    def stream_answer(self, user_question, gender, skin_type=None, history=None):
+        try:
+            try:
+                client = get_openai_client()
+            except openai.OpenAIError:
+                # No API key: answer from the offline intents rather than the "service unavailable" fallbacks
+                metrics.inc("llm_fallbacks", call="consultant", reason="offline")
+                yield offline_consultant_response(user_question, gender, skin_type)
+                return
+
+            # Keyed on the conversation too, so a follow-up is only answered from cache in the same context
+            cached = self.answer_cache.get(user_question, gender, history)
+            if cached is not None:
+                yield cached
+                return
+
+            started = time.perf_counter()
+
+            prompt = f"""
+            You are a professional beauty consultant named Sofi. The user has asked the following question:
+            "{user_question}"
+
+            Provide a helpful, personalized response about beauty products or techniques.
+            User's gender preference: {gender}
+
+            Keep your response friendly, concise (max 3-4 sentences), and actionable.
+            Include specific product types when relevant, but don't mention specific brands.
+            """
+
+            stream = client.chat.completions.create(
+                model=CONSULTANT_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are Sofi, a knowledgeable and friendly virtual beauty consultant."},
+                    *(history or []),
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=200,
+                stream=True,
+                timeout=CONSULTANT_TIMEOUT
+            )
+        except Exception as e:
+            metrics.inc("llm_fallbacks", call="consultant", reason=fallback_reason(e))
+            yield fallback_consultant_response(user_question, gender, skin_type)
+            return
+
+        answer = ""
+        try:
+            for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    # Drop leading whitespace like the non-streaming .strip() did
+                    text = text if answer else text.lstrip()
+                    if text:
+                        if not answer:
+                            metrics.observe("llm_first_token", time.perf_counter() - started, call="consultant")
+                        answer += text
+                        yield text
+        except Exception as e:
+            metrics.inc("llm_fallbacks", call="consultant", reason=fallback_reason(e) if not answer else "partial")
+            # Keep a partial answer; only fall back if nothing arrived at all
+            if not answer:
+                yield fallback_consultant_response(user_question, gender, skin_type)
+            return
+        metrics.observe("llm_call", time.perf_counter() - started, call="consultant")
+
+        if answer.strip():
+            self.answer_cache.set(user_question, gender, answer.strip(), history)
+        else:
+            metrics.inc("llm_fallbacks", call="consultant", reason="empty")
+            yield fallback_consultant_response(user_question, gender, skin_type)
+
+    def ask(self, user_question, gender, skin_type=None, history=None):
+        return "".join(self.stream_answer(user_question, gender, skin_type, history)).strip()
+
+    def stats(self):
+        return {
+            "catalog": self.provider.stats(),
+            "catalog_flight": self.catalog_flight.stats(),
+            "description_cache": self.description_cache.stats(),
+            "description_flight": self.description_flight.stats(),
+            "answer_cache": self.answer_cache.stats(),
+        }
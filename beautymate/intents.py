@@ -0,0 +1,118 @@
+import re
+from collections import namedtuple
+
+# Offline intent engine for Sofi's keyword answers.
+#
+# The knowledge base below is compiled once into a phrase -> intents table.
+# Matching a question splits it into words and looks up every 1..N word
+# window, so the cost depends on the question length only, not on how many
+# intents or synonyms exist, and keywords only match whole words ("eyeliner"
+# no longer triggers on "liner" inside another word). Every matching intent is
+# scored and the best one is rendered with the user's gender and skin type.
+
+Intent = namedtuple("Intent", ["name", "keywords", "offline", "fallback"])
+
+SKIN_TYPES = ("dry", "oily", "combination", "normal", "sensitive")
+
+# offline: answer when no OpenAI client is configured; fallback: answer when the API call fails (defaults to offline)
+INTENTS = [
+    Intent("foundation", ["foundation", "foundations", "base makeup", "complexion"],
+           "For choosing the right foundation, match it to your jawline in natural light. If you're {gender}, look for formulas designed for {skin_type} skin. Test a few shades to find your perfect match.",
+           "For {gender} users, I recommend matching foundation to your jawline in natural light. Look for formulas that suit {skin_type} skin. Consider testing samples before purchasing a full-size product."),
+    Intent("lipstick", ["lipstick", "lipsticks", "lip color", "lip colour", "lip shade"],
+           "When selecting lipstick, consider your skin undertone - cool tones look best with blue-reds, warm tones with orange-reds. For {gender} users, matte formulas last longer while creams are more hydrating.",
+           "When choosing lipstick colors for {gender} users, consider your undertone. Warm skin looks great with orange-reds, while cool skin pairs well with blue-reds and berries."),
+    Intent("eyeshadow", ["eyeshadow", "eyeshadows", "eye shadow", "eye shadows", "palette", "smokey eye", "smoky eye"],
+           "The best eyeshadows for {gender} users depend on your eye color. Brown eyes pop with purples and blues, green eyes with rusty reds, and blue eyes with warm bronzes and coppers. Start with a neutral palette for versatility.",
+           "For {gender} users, I suggest starting with a neutral palette that complements your eye color. Apply lighter shades on the lid and darker colors in the crease for dimension."),
+    Intent("mascara", ["mascara", "mascaras", "lashes", "eyelashes"],
+           "For the best mascara application, wiggle the wand at the base of your lashes then sweep upward. Curling your lashes first creates an eye-opening effect, and you can layer for more drama.",
+           None),
+    Intent("bronzer", ["bronzer", "bronzers", "bronzing", "contour", "contouring"],
+           "Apply bronzer where the sun naturally hits: forehead, cheekbones, bridge of nose, and jawline. For {gender} users, choose a shade just 1-2 tones deeper than your skin for the most natural result.",
+           None),
+    Intent("blush", ["blush", "blushes", "blusher", "cheek color", "cheeks"],
+           "For blush placement, smile and apply to the apples of your cheeks, then blend upward toward your temples. Cream blushes work well for dry skin, while powders are better for oily skin.",
+           None),
+    Intent("skincare", ["skincare", "skin care", "routine", "cleanser", "serum", "moisturizer", "moisturiser"],
+           "A basic skincare routine should include cleanser, moisturizer, and sunscreen. For {gender} users, add a serum with ingredients targeting your specific concerns like vitamin C for brightness or hyaluronic acid for hydration.",
+           "A good skincare routine for {gender} users includes cleansing, moisturizing, and sun protection. Add targeted treatments based on your specific concerns like acne, aging, or hyperpigmentation."),
+    Intent("eyeliner", ["eyeliner", "eye liner", "winged liner", "cat eye"],
+           "For a clean eyeliner line, work in short strokes from the inner corner outward, keeping close to the lash line. Pencils are the most forgiving for {gender} users just starting out, while liquids give the sharpest wing.",
+           None),
+    Intent("eyebrow", ["eyebrow", "eyebrows", "brow", "brows", "brow pencil"],
+           "Brush your brows up first, then fill sparse areas with light, hair-like strokes in a shade that matches your natural brow color. Set everything with a clear or tinted brow gel.",
+           None),
+    Intent("lip liner", ["lip liner", "lipliner", "lip pencil"],
+           "Line just along your natural lip edge with a liner close to your lipstick shade, then fill in lightly to help color last and stop feathering.",
+           None),
+    Intent("nail polish", ["nail polish", "nail varnish", "nails", "manicure"],
+           "For a chip-resistant manicure, start with a base coat, apply two thin coats of color, and seal the free edge with a top coat. Let each layer dry for a couple of minutes.",
+           None),
+    Intent("concealer", ["concealer", "concealers", "dark circles", "under eye", "blemish", "blemishes"],
+           "Pick a concealer one shade lighter than your foundation for under the eyes and an exact match for blemishes. For {skin_type} skin, tap it in with your ring finger and set lightly with powder.",
+           None),
+    Intent("primer", ["primer", "primers", "pores", "makeup base"],
+           "A primer helps makeup last and smooths texture. For {skin_type} skin, choose a hydrating primer if you're dry or a mattifying, pore-blurring one if you get shiny.",
+           None),
+    Intent("sunscreen", ["sunscreen", "spf", "sun protection", "sunblock"],
+           "Wear a broad-spectrum SPF 30 or higher every day as the last step of your skincare routine. For {skin_type} skin, lightweight gel or fluid formulas sit nicely under makeup.",
+           None),
+    Intent("acne", ["acne", "breakout", "breakouts", "pimple", "pimples", "spots"],
+           "For breakout-prone skin, look for non-comedogenic products and treatments with salicylic acid or benzoyl peroxide. Keep your routine gentle - over-scrubbing usually makes breakouts worse.",
+           None),
+    Intent("setting", ["setting spray", "setting powder", "long lasting", "makeup last", "oil control"],
+           "To make makeup last, set the T-zone with a light dusting of translucent powder and finish with a setting spray. {skin_type_title} skin benefits most from a mattifying formula if you get shiny during the day.",
+           None),
+    Intent("highlighter", ["highlighter", "highlight", "glow", "strobing"],
+           "Apply highlighter to the high points of your face - tops of the cheekbones, brow bone, and the bridge of your nose. Cream highlighters melt into dry skin, while powders stay put on oily skin.",
+           None),
+]
+
+OFFLINE_DEFAULT = "Thank you for your beauty question! For {gender} users, I generally recommend starting with quality products suited to your skin type and tone. Could you provide more details about what specific beauty advice you're looking for?"
+FALLBACK_DEFAULT = "I'd be happy to help with your beauty questions! For personalized recommendations, I need to know more about your skin type, concerns, and preferences. Could you share a bit more about what you're looking for?"
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class IntentEngine:
+    def __init__(self, intents):
+        self.intents = list(intents)
+        self.phrases = {}
+        self.max_words = 1
+        for intent in self.intents:
+            for keyword in intent.keywords:
+                words = tuple(WORD_RE.findall(keyword.lower()))
+                self.phrases.setdefault(words, []).append(intent)
+                self.max_words = max(self.max_words, len(words))
+
+    def match(self, question):
+        """All intents matching `question` as (score, intent) pairs, best first."""
+        words = WORD_RE.findall(question.lower())
+        scores = {}
+        first_seen = {}
+        for start in range(len(words)):
+            for length in range(1, min(self.max_words, len(words) - start) + 1):
+                for intent in self.phrases.get(tuple(words[start:start + length]), ()):
+                    # Longer phrases are more specific, so they count for more
+                    scores[intent.name] = scores.get(intent.name, 0) + length
+                    first_seen.setdefault(intent.name, (start, intent))
+        ranked = sorted(scores, key=lambda name: (-scores[name], first_seen[name][0]))
+        return [(scores[name], first_seen[name][1]) for name in ranked]
+
+    def respond(self, question, gender, skin_type=None, mode="offline"):
+        """Render the best matching answer, or the generic one for `mode` if nothing matches."""
+        matches = self.match(question)
+        if matches:
+            intent = matches[0][1]
+            template = intent.fallback if mode == "fallback" and intent.fallback else intent.offline
+        else:
+            template = FALLBACK_DEFAULT if mode == "fallback" else OFFLINE_DEFAULT
+
+        # A skin type mentioned in the question beats the one from the profile
+        words = set(WORD_RE.findall(question.lower()))
+        skin = next((s for s in SKIN_TYPES if s in words), (skin_type or "").lower()) or "your"
+        return template.format(gender=gender.lower(), skin_type=skin, skin_type_title=skin.capitalize())
+
+
+ENGINE = IntentEngine(INTENTS)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Content-addressed cache for LLM responses.
+#
+# Entries are keyed on a hash of everything that determines the output (the
+# inputs, the model and the prompt version). An in-process LRU answers repeat
+# lookups without touching disk; behind it a SQLite file survives restarts and
+# is shared by every session and worker process on the machine.
+
+CACHE_PATH = os.getenv("BEAUTYMATE_LLM_CACHE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache.sqlite"))
+
+
+def cache_key(*parts):
+    """Stable hash of the inputs that determine an LLM response."""
+    payload = json.dumps([str(part) for part in parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=30 * 24 * 3600, max_entries=20000, memory_entries=1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[0]
+
+            try:
+                row = self.db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    with self.db:
+                        self.db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], row[1])
+                    self.counters["disk_hits"] += 1
+                    return row[0]
+            except sqlite3.Error:
+                # A locked or broken cache file should never break the app
+                pass
+
+            self.memory.pop(key, None)
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self._remember(key, value, now)
+            try:
+                with self.db:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, created_at, used_at) VALUES (?, ?, ?, ?)",
+                        (key, value, now, now),
+                    )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._evict(now)
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key, value, created_at):
+        self.memory[key] = (value, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now):
+        # Drop expired rows, then the least recently used ones beyond max_entries
+        with self.db:
+            expired = self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)).rowcount
+            overflow = self.db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.counters["evictions"] += expired + overflow
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            with self.db:
+                self.db.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
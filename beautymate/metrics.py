@@ -0,0 +1,241 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide latency histograms and counters.
+#
+#   BEAUTYMATE_METRICS=1               turn recording on (off by default)
+#   BEAUTYMATE_METRICS_PORT=9108       serve /metrics (Prometheus text) and /metrics.json
+#   BEAUTYMATE_METRICS_FILE=path.json  rewrite a JSON dump every BEAUTYMATE_METRICS_INTERVAL seconds
+#
+# Histograms are cumulative-bucket latency histograms in seconds; counters
+# count events such as fallbacks, timeouts and cache hits. Components that
+# already keep their own statistics (caches, clients, the catalog provider)
+# are registered as collectors and read at export time instead of being
+# double-counted. When disabled, timer() hands back a shared no-op context
+# manager and inc()/observe() return immediately.
+
+ENABLED = os.getenv("BEAUTYMATE_METRICS", "0").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("BEAUTYMATE_METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("BEAUTYMATE_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.getenv("BEAUTYMATE_METRICS_INTERVAL", "15"))
+
+PREFIX = "beautymate_"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_collectors = {}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile; None if it's past the last bucket."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (None,), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(name, **labels):
+    """Context manager recording the duration of its block in histogram `name`."""
+    return _Timer(name, labels) if ENABLED else _NO_TIMER
+
+
+def timed(name, **labels):
+    """Decorator form of timer()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_collector(name, collect):
+    """Export `collect()` (a flat dict of numbers) as gauges named `<name>_<key>` at export time."""
+    with _lock:
+        _collectors[name] = collect
+
+
+def snapshot():
+    """Everything recorded so far, as plain JSON-serializable data."""
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                      for key, h in _histograms.items()}
+        counters = dict(_counters)
+        collectors = dict(_collectors)
+
+    data = {"timestamp": time.time(), "enabled": ENABLED, "histograms": [], "counters": [], "gauges": []}
+    for (name, labels), (counts, total, count, p50, p95, p99) in sorted(histograms.items()):
+        data["histograms"].append({"name": name, "labels": dict(labels), "count": count, "sum": total,
+                                   "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], counts)),
+                                   "p50": p50, "p95": p95, "p99": p99})
+    for (name, labels), value in sorted(counters.items()):
+        data["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    for name, collect in sorted(collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            # A broken collector must not take the whole export down
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                data["gauges"].append({"name": f"{name}_{key}", "labels": {}, "value": value})
+    return data
+
+
+def _labels_text(labels, extra=None):
+    pairs = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """The current metrics in Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for h in data["histograms"]:
+        name = f"{PREFIX}{h['name']}_seconds"
+        declare(name, "histogram")
+        cumulative = 0
+        for bound, count in h["buckets"].items():
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels_text(h['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels_text(h['labels'])} {h['sum']:.6f}")
+        lines.append(f"{name}_count{_labels_text(h['labels'])} {h['count']}")
+    for c in data["counters"]:
+        name = f"{PREFIX}{c['name']}_total"
+        declare(name, "counter")
+        lines.append(f"{name}{_labels_text(c['labels'])} {c['value']}")
+    for g in data["gauges"]:
+        name = PREFIX + g["name"]
+        declare(name, "gauge")
+        lines.append(f"{name} {g['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(path):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f, indent=1)
+    os.replace(tmp_path, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_INTERVAL):
+    """Start the HTTP endpoint and/or the periodic JSON dump configured for this process."""
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if path:
+        def dump_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    dump_json(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=dump_forever, name="metrics-dump", daemon=True).start()
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Top-k selection over candidate row ids.
+#
+# Keys are (values, descending) pairs over the full catalog arrays, most
+# significant first; NaN always ranks last. Only the first key is used for the
+# O(n) partition step, the survivors are then ordered by every key with the
+# row id as the final tie-breaker, so results are deterministic.
+
+RATING_THEN_PRICE = ("rating", True), ("price", False)
+
+
+def _sort_key(values, descending):
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), np.inf, -values if descending else values)
+
+
+def top_k(row_ids, keys, k=5):
+    """Return the best `k` of `row_ids` ordered by `keys`, a sequence of (values, descending) pairs."""
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if k <= 0 or len(row_ids) == 0:
+        return row_ids[:0]
+    if not keys:
+        return np.sort(row_ids)[:k]
+
+    sort_keys = [_sort_key(values[row_ids], descending) for values, descending in keys]
+    if len(row_ids) > k:
+        # Keep every candidate tied with the k-th best primary key so later keys can break the tie
+        kth = np.partition(sort_keys[0], k - 1)[k - 1]
+        keep = np.flatnonzero(sort_keys[0] <= kth)
+        row_ids = row_ids[keep]
+        sort_keys = [key[keep] for key in sort_keys]
+
+    # np.lexsort treats the last key as primary
+    order = np.lexsort([row_ids] + sort_keys[::-1])
+    return row_ids[order[:k]]
+
+
+def top_k_frame(df, k=5, keys=RATING_THEN_PRICE):
+    """Positional row ids of the best `k` rows of `df` using column-name keys; missing columns are skipped."""
+    key_arrays = [(df[column].to_numpy(dtype=np.float64), descending)
+                  for column, descending in keys if column in df.columns]
+    return top_k(np.arange(len(df)), key_arrays, k)
@@ -0,0 +1,149 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import pandas as pd
+
+# Built-in sample catalog, used whenever the local snapshot cannot serve a request.
+#
+# The products are defined once as immutable records and turned into a single
+# column-oriented DataFrame at import time, together with the category/brand
+# vocabularies and one pre-filtered frame per category. Lookups hand out these
+# shared frames instead of rebuilding them, so callers must treat them as
+# read-only (use .assign / .copy before changing a column).
+
+SampleProduct = namedtuple("SampleProduct", ["name", "brand", "price", "image_link", "product_type", "rating", "description"])
+
+PREMIUM_IMAGE = "https://images.unsplash.com/photo-1596462502278-27bfdc403348?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80"
+
+SAMPLE_PRODUCTS = (
+    SampleProduct(
+        name="Natural Glow Bronzer",
+        brand="EarthLab Cosmetics",
+        price=28.99,
+        image_link="https://images.unsplash.com/photo-1599733594230-6b823276abcc?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="bronzer",
+        rating=4.8,
+        description="A natural bronzer that gives a sun-kissed glow.",
+    ),
+    SampleProduct(
+        name="Radiant Blush Duo",
+        brand="Pure Beauty",
+        price=24.5,
+        image_link="https://images.unsplash.com/photo-1581514578022-3aafd55bbe4b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="blush",
+        rating=4.5,
+        description="A dual-color blush for the perfect cheek definition.",
+    ),
+    SampleProduct(
+        name="Long-lasting Matte Lipstick",
+        brand="ColorPop",
+        price=19.99,
+        image_link="https://images.unsplash.com/photo-1586495777744-4413f21062fa?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="lipstick",
+        rating=4.7,
+        description="A creamy matte lipstick that lasts all day.",
+    ),
+    SampleProduct(
+        name="Waterproof Mascara",
+        brand="Lash Focus",
+        price=22.0,
+        image_link="https://images.unsplash.com/photo-1591360236480-4ed861025fa1?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="mascara",
+        rating=4.6,
+        description="Volumizing and lengthening mascara that's truly waterproof.",
+    ),
+    SampleProduct(
+        name="Shimmer Eyeshadow Palette",
+        brand="Glimmer",
+        price=32.0,
+        image_link="https://images.unsplash.com/photo-1583241119308-050d4c933519?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="eyeshadow",
+        rating=4.9,
+        description="A palette of 12 shimmer eyeshadows for creating stunning looks.",
+    ),
+    SampleProduct(
+        name="Hydrating Foundation",
+        brand="SkinGlow",
+        price=35.99,
+        image_link="https://images.unsplash.com/photo-1590156206058-ae06662e566b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="foundation",
+        rating=4.7,
+        description="A moisturizing foundation for dry skin types.",
+    ),
+    SampleProduct(
+        name="Precision Eyeliner",
+        brand="Line Perfect",
+        price=18.5,
+        image_link="https://images.unsplash.com/photo-1631214503374-35d266ee804e?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="eyeliner",
+        rating=4.8,
+        description="A fine-tip eyeliner for precise application.",
+    ),
+    SampleProduct(
+        name="Brow Definer Pencil",
+        brand="BrowMaster",
+        price=16.99,
+        image_link="https://images.unsplash.com/photo-1597225244660-1cd128c64284?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="eyebrow",
+        rating=4.6,
+        description="Define and shape your brows with this precision pencil.",
+    ),
+    SampleProduct(
+        name="Creamy Lip Liner",
+        brand="LipDefine",
+        price=15.0,
+        image_link="https://images.unsplash.com/photo-1600612253971-422e7f7faeb6?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="lip liner",
+        rating=4.4,
+        description="A smooth, non-drying lip liner that prevents feathering.",
+    ),
+    SampleProduct(
+        name="Quick-Dry Nail Polish",
+        brand="NailPro",
+        price=12.99,
+        image_link="https://images.unsplash.com/photo-1603481588273-2f908a9a7a1b?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80",
+        product_type="nail polish",
+        rating=4.3,
+        description="Fast-drying, chip-resistant nail polish in vibrant colors.",
+    ),
+)
+
+
+class SampleCatalog:
+    __slots__ = ("products", "categories", "brands", "_by_category")
+
+    def __init__(self, records):
+        self.products = pd.DataFrame(records, columns=SampleProduct._fields)
+        self.categories = tuple(sorted(self.products["product_type"].unique()))
+        self.brands = tuple(sorted(self.products["brand"].unique()))
+        # Category frames keep their row ids in `products` as the index
+        self._by_category = dict(tuple(self.products.groupby(self.products["product_type"].str.lower())))
+
+    def products_for(self, category=None):
+        """Products for a category; unknown categories get the full catalog plus one "Premium" product."""
+        if not category or category.lower() == "all":
+            return self.products
+        key = category.lower()
+        if key in self._by_category:
+            return self._by_category[key]
+        return self._with_premium(key)
+
+    def covers(self, category=None):
+        """Whether products_for(category) comes from this catalog alone, without a made-up "Premium" product."""
+        return not category or category.lower() == "all" or category.lower() in self._by_category
+
+    @lru_cache(maxsize=64)
+    def _with_premium(self, category):
+        premium = SampleProduct(
+            name=f"Premium {category.title()}",
+            brand="BeautyMate",
+            price=25.0,
+            image_link=PREMIUM_IMAGE,
+            product_type=category,
+            rating=4.5,
+            description=f"A high-quality {category}.",
+        )
+        return pd.concat([self.products, pd.DataFrame([premium], columns=SampleProduct._fields)], ignore_index=True)
+
+
+SAMPLE_CATALOG = SampleCatalog(SAMPLE_PRODUCTS)
@@ -0,0 +1,135 @@
+import numpy as np
+
+from beautymate.catalog import DerivedArrays
+
+# Personalized product scoring.
+#
+# ProductScorer turns a catalog into a float32 feature matrix once per catalog
+# load: normalized rating, price value, one-hot product type and keyword
+# features (skin type, age, gender, clean beauty) matched in the name,
+# description and tags. A user profile becomes a weight vector over the same
+# columns, so scoring the whole catalog for a profile is a single
+# matrix-vector product.
+
+# How much each group of features counts towards the score
+DEFAULT_WEIGHTS = {
+    "rating": 1.0,
+    "price": 0.2,
+    "skin": 0.3,
+    "age": 0.2,
+    "gender": 0.2,
+    "type": 0.15,
+    "clean": 0.05,
+}
+
+KEYWORD_FEATURES = {
+    "dry": r"dry skin|hydrat|moistur|nourish|dewy",
+    "oily": r"oily skin|oil[- ]free|matte|shine|oil control|pore",
+    "combination": r"combination|balanc",
+    "all_skin": r"all skin|every skin|sensitive|gentle",
+    "youthful": r"glitter|shimmer|neon|sheer|tinted|\bfun\b",
+    "mature": r"anti[- ]?aging|wrinkle|firming|fine lines|mature|age[- ]defying",
+    "men": r"\bmen\b|\bmen's\b|\bmale\b|for him|grooming",
+    "unisex": r"unisex|everyone|natural look",
+    "clean": r"vegan|organic|cruelty free|natural|gluten free",
+}
+
+SKIN_FEATURES = {
+    "dry": {"dry": 1.0},
+    "oily": {"oily": 1.0},
+    "combination": {"combination": 1.0, "dry": 0.5, "oily": 0.5},
+    "normal": {"all_skin": 1.0},
+}
+AGE_FEATURES = {
+    "under 18": {"youthful": 1.0, "mature": -0.5},
+    "18-24": {"youthful": 1.0},
+    "35-44": {"mature": 0.5},
+    "45+": {"mature": 1.0},
+}
+# Younger users are steered towards cheaper products
+AGE_PRICE_SENSITIVITY = {"under 18": 1.0, "18-24": 0.8, "25-34": 0.5, "35-44": 0.4, "45+": 0.4}
+GENDER_FEATURES = {
+    "male": {"men": 1.0, "unisex": 0.5},
+    "unisex": {"unisex": 1.0},
+}
+GENDER_TYPE_AFFINITY = {
+    "male": {"foundation": 1.0, "bronzer": 1.0, "eyebrow": 1.0, "lip liner": -0.5, "nail polish": -0.5},
+}
+
+
+def _column(products, name):
+    return products[name].fillna("").astype(str) if name in products.columns else None
+
+
+class ProductScorer(DerivedArrays):
+    ARRAYS = ("matrix", "features")
+
+    def __init__(self, products):
+        self.size = len(products)
+        text = None
+        for name in ("name", "description", "tags"):
+            column = _column(products, name)
+            if column is not None:
+                text = column if text is None else text + " " + column
+        text = text.str.lower() if text is not None else None
+
+        rating = products["rating"].to_numpy(dtype=np.float64) if "rating" in products.columns else np.full(self.size, np.nan)
+        price = products["price"].to_numpy(dtype=np.float64) if "price" in products.columns else np.full(self.size, np.nan)
+        # Price value is 1 for the cheapest product and 0 for the most expensive; unknown prices sit in the middle
+        price_rank = np.argsort(np.argsort(np.where(np.isnan(price), np.inf, price), kind="stable"), kind="stable")
+        price_value = 1 - price_rank / max(1, np.count_nonzero(~np.isnan(price)) - 1)
+        price_value = np.where(np.isnan(price), 0.5, np.clip(price_value, 0, 1))
+
+        types = _column(products, "product_type")
+        types = types.str.lower() if types is not None else None
+        self.types = sorted(t for t in types.unique() if t) if types is not None else []
+
+        columns = [np.nan_to_num(rating / 5), price_value]
+        self.features = ["rating", "price"]
+        for product_type in self.types:
+            columns.append((types == product_type).to_numpy())
+            self.features.append(f"type:{product_type}")
+        for name, pattern in KEYWORD_FEATURES.items():
+            columns.append(text.str.contains(pattern, regex=True).to_numpy() if text is not None else np.zeros(self.size))
+            self.features.append(name)
+
+        self.matrix = np.column_stack(columns).astype(np.float32) if self.size else np.zeros((0, len(columns)), np.float32)
+        self.positions = {name: i for i, name in enumerate(self.features)}
+
+    def arrays(self):
+        return {"matrix": self.matrix, "features": np.asarray(self.features, dtype=str)}
+
+    def _restore(self, catalog):
+        self.size = len(self.matrix)
+        self.features = [str(name) for name in self.features]
+        self.types = [name[len("type:"):] for name in self.features if name.startswith("type:")]
+        self.positions = {name: i for i, name in enumerate(self.features)}
+
+    def profile_vector(self, gender=None, age_group=None, skin_type=None, weights=None):
+        """Weight vector over the feature columns for a user profile."""
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        gender, age_group, skin_type = ((value or "").lower() for value in (gender, age_group, skin_type))
+        vector = np.zeros(len(self.features), dtype=np.float32)
+
+        def add(feature, value):
+            position = self.positions.get(feature)
+            if position is not None:
+                vector[position] += value
+
+        add("rating", weights["rating"])
+        add("price", weights["price"] * AGE_PRICE_SENSITIVITY.get(age_group, 0.5))
+        add("clean", weights["clean"])
+        for group, table in (("skin", SKIN_FEATURES.get(skin_type)), ("age", AGE_FEATURES.get(age_group)),
+                             ("gender", GENDER_FEATURES.get(gender))):
+            for feature, value in (table or {}).items():
+                add(feature, weights[group] * value)
+        for product_type, value in GENDER_TYPE_AFFINITY.get(gender, {}).items():
+            add(f"type:{product_type}", weights["type"] * value)
+        return vector
+
+    def score(self, vector):
+        """Personalized score of every product for a profile vector."""
+        return self.matrix @ vector
+
+    def score_profile(self, gender=None, age_group=None, skin_type=None, weights=None):
+        return self.score(self.profile_vector(gender, age_group, skin_type, weights))
@@ -0,0 +1,154 @@
+import re
+
+import numpy as np
+
+from beautymate.catalog import DerivedArrays
+
+# Full-text product search.
+#
+# An in-memory inverted index over name, brand, tags and description, built
+# once per catalog load. Terms are lowercased and lightly stemmed; postings are
+# stored CSR-style (offsets into flat doc-id and weight arrays) with the BM25
+# contribution of every posting precomputed, so a query only adds a few
+# posting slices into a score array. Query words that are not in the
+# vocabulary are expanded to terms they are a prefix of, and to terms one
+# edit away (via a deletion-neighbourhood table), at a reduced weight.
+# Terms are ASCII, so the vocabulary and the neighbourhood table are sorted
+# fixed-width byte arrays searched with np.searchsorted, and the whole index
+# is flat arrays.
+
+FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "tags": 1.5, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+MAX_EXPANSIONS = 20
+MIN_TYPO_LENGTH = 4
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def stem(word):
+    """Strip common English suffixes so "hydrating"/"hydrated"/"hydrates" share a term."""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith(("ies", "ied")) and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+        return word[:-2]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    if word.endswith("s") and not word.endswith(("ss", "us")):
+        word = word[:-1]
+    # "hydrate" and "hydrating" both become "hydrat"
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _deletions(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchIndex(DerivedArrays):
+    ARRAYS = ("vocabulary", "offsets", "docs", "weights", "variants", "variant_terms")
+
+    def __init__(self, products):
+        self.size = len(products)
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float64)
+        for field, weight in FIELD_WEIGHTS.items():
+            if field not in products.columns:
+                continue
+            for doc, text in enumerate(products[field].fillna("").astype(str)):
+                for token in tokenize(text):
+                    term_docs = postings.setdefault(stem(token), {})
+                    term_docs[doc] = term_docs.get(doc, 0.0) + weight
+                    lengths[doc] += weight
+
+        vocabulary = sorted(postings)
+        self.vocabulary = np.array([term.encode("ascii") for term in vocabulary], dtype=bytes)
+        self.offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in vocabulary], out=self.offsets[1:])
+        self.docs = np.empty(self.offsets[-1], dtype=np.int32)
+        frequencies = np.empty(self.offsets[-1], dtype=np.float64)
+        for i, term in enumerate(vocabulary):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            self.docs[start:end] = list(postings[term].keys())
+            frequencies[start:end] = list(postings[term].values())
+
+        # BM25 contribution of each posting: idf(term) * saturated, length-normalized term frequency
+        document_frequency = np.diff(self.offsets)
+        idf = np.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if self.size else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[self.docs] / average_length)
+        self.weights = (np.repeat(idf, document_frequency) * frequencies * (BM25_K1 + 1) / (frequencies + norm)).astype(np.float32)
+
+        # Every term and its one-letter deletions -> term ids, for edit-distance-1 lookups
+        neighbourhood = sorted((variant.encode("ascii"), term_id) for term_id, term in enumerate(vocabulary)
+                               if len(term) >= MIN_TYPO_LENGTH and term.isalpha()
+                               for variant in _deletions(term) | {term})
+        self.variants = np.array([variant for variant, _ in neighbourhood], dtype=bytes)
+        self.variant_terms = np.array([term_id for _, term_id in neighbourhood], dtype=np.int32)
+
+    def _restore(self, catalog):
+        self.size = len(catalog)
+
+    def term_id(self, term):
+        """Id of a (stemmed) term, or None if no product contains it."""
+        term = term.encode("ascii", "ignore")
+        i = np.searchsorted(self.vocabulary, term)
+        return int(i) if i < len(self.vocabulary) and self.vocabulary[i] == term else None
+
+    def _prefixed(self, prefix):
+        prefix = prefix.encode("ascii", "ignore")
+        start = np.searchsorted(self.vocabulary, prefix)
+        term_ids = []
+        for term_id in range(start, min(start + MAX_EXPANSIONS, len(self.vocabulary))):
+            if not self.vocabulary[term_id].startswith(prefix):
+                break
+            term_ids.append(term_id)
+        return term_ids
+
+    def _typos(self, word):
+        term_ids = set()
+        for variant in _deletions(word) | {word}:
+            variant = variant.encode("ascii", "ignore")
+            start, end = np.searchsorted(self.variants, variant, "left"), np.searchsorted(self.variants, variant, "right")
+            term_ids.update(self.variant_terms[start:end].tolist())
+        return sorted(term_ids)[:MAX_EXPANSIONS]
+
+    def expand(self, word, is_last=False):
+        """(term id, weight) pairs a query word matches: the exact stem, then prefix and typo expansions."""
+        term_id = self.term_id(stem(word))
+        matches = {term_id: 1.0} if term_id is not None else {}
+        # The last word may still be being typed, so it is always completed as a prefix
+        if term_id is None or is_last:
+            for prefixed in self._prefixed(word):
+                matches.setdefault(prefixed, PREFIX_WEIGHT)
+        if term_id is None and len(word) >= MIN_TYPO_LENGTH and word.isalpha():
+            for typo in self._typos(word):
+                matches.setdefault(typo, TYPO_WEIGHT)
+        return matches.items()
+
+    def search(self, query):
+        """(matching row ids in ascending order, BM25 score of every row) for a free-text query."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        words = tokenize(query)
+        for position, word in enumerate(words):
+            # A word counts once per product, through its best-matching term
+            word_scores = np.zeros(self.size, dtype=np.float32)
+            for term_id, weight in self.expand(word, is_last=position == len(words) - 1):
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                docs = self.docs[start:end]
+                word_scores[docs] = np.maximum(word_scores[docs], weight * self.weights[start:end])
+            scores += word_scores
+        return np.flatnonzero(scores > 0), scores
+
+    def nbytes(self):
+        return (self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes + self.vocabulary.nbytes
+                + self.variants.nbytes + self.variant_terms.nbytes)
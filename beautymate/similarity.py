@@ -0,0 +1,129 @@
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+from beautymate.catalog import DerivedArrays
+
+# "More like this" over the product catalog.
+#
+# Every product is embedded offline with a hashing vectorizer over its name,
+# brand, product type, tags and description, TF-IDF weighted per hash bucket
+# and L2-normalized. The k nearest neighbours of every product (cosine
+# similarity) are computed once per catalog version with blocked
+# matrix-matrix products and kept as a small (rows x k) table, so a lookup is
+# an array slice. The dense vectors are dropped after the build. Products are
+# found by a sorted array of name/brand hashes rather than a dict, so the whole
+# index is flat arrays.
+
+SIMILARITY_DIM = 256
+SIMILARITY_NEIGHBOURS = 12
+BLOCK_ROWS = 128
+
+# Field name -> (token prefix, weight); a shared type or brand says more than a shared description word
+FIELDS = {
+    "product_type": ("t:", 2.0),
+    "brand": ("b:", 1.5),
+    "name": ("n:", 1.0),
+    "tags": ("g:", 1.0),
+    "description": ("d:", 0.5),
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def product_lookup_key(product):
+    return (str(product.get("name", "")).lower(), str(product.get("brand", "")).lower())
+
+
+def _key_hash(name, brand):
+    digest = hashlib.blake2b(f"{name}\0{brand}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class SimilarityIndex(DerivedArrays):
+    ARRAYS = ("neighbours", "similarities", "key_hashes", "key_rows")
+
+    def __init__(self, products, dim=SIMILARITY_DIM, neighbours=SIMILARITY_NEIGHBOURS):
+        self.products = products
+        self.size = len(products)
+        self.dim = dim
+        hashes = np.fromiter((_key_hash(name, brand) for name, brand in
+                              zip(products["name"].str.lower(), products["brand"].str.lower())),
+                             dtype=np.uint64, count=self.size)
+        # Sorted by hash, then row, so the first product with a given name and brand is found first
+        self.key_rows = np.lexsort((np.arange(self.size), hashes)).astype(np.int64)
+        self.key_hashes = hashes[self.key_rows]
+
+        vectors = self._embed(products)
+        self.neighbours, self.similarities = self._nearest(vectors, min(neighbours, max(0, self.size - 1)))
+
+    def _restore(self, catalog):
+        self.products = catalog
+        self.size = len(catalog)
+
+    def _embed(self, products):
+        buckets = {}
+
+        def bucket(token):
+            # The same few thousand tokens repeat across the catalog, so hash each one once
+            h = buckets.get(token)
+            if h is None:
+                h = buckets[token] = zlib.crc32(token.encode("utf-8")) % self.dim
+            return h
+
+        counts = np.zeros((self.size, self.dim), dtype=np.float32)
+        for field, (prefix, weight) in FIELDS.items():
+            if field not in products.columns:
+                continue
+            for row, text in enumerate(products[field].fillna("").astype(str).str.lower()):
+                if field in ("product_type", "brand"):
+                    tokens = [text] if text else []
+                elif field == "tags":
+                    tokens = [t.strip() for t in text.split(",") if t.strip()]
+                else:
+                    tokens = TOKEN_RE.findall(text)
+                for token in tokens:
+                    counts[row, bucket(prefix + token)] += weight
+
+        # Sublinear term frequency times smoothed inverse document frequency of each bucket
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = np.log((1 + self.size) / (1 + document_frequency)) + 1
+        vectors = np.log1p(counts, out=counts) * idf.astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    def _nearest(self, vectors, k):
+        neighbours = np.zeros((self.size, k), dtype=np.int32)
+        similarities = np.zeros((self.size, k), dtype=np.float32)
+        if k == 0:
+            return neighbours, similarities
+        for start in range(0, self.size, BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS] @ vectors.T
+            rows = np.arange(len(block))
+            # A product is not its own neighbour
+            block[rows, start + rows] = -np.inf
+            top = np.argpartition(block, -k, axis=1)[:, -k:]
+            top_similarity = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_similarity, axis=1, kind="stable")
+            neighbours[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+            similarities[start:start + len(block)] = np.take_along_axis(top_similarity, order, axis=1)
+        return neighbours, similarities
+
+    def row_of(self, product):
+        """Row of a product (a dict or DataFrame row) in this catalog, matched on name and brand; None if absent."""
+        key = _key_hash(*product_lookup_key(product))
+        i = np.searchsorted(self.key_hashes, np.uint64(key))
+        return int(self.key_rows[i]) if i < len(self.key_hashes) and self.key_hashes[i] == key else None
+
+    def similar(self, row, k=5, min_similarity=0.0):
+        """Row ids of the `k` products most similar to catalog row `row`, most similar first."""
+        ids = self.neighbours[row, :k]
+        return ids[self.similarities[row, :k] > min_similarity]
+
+    def take(self, row_ids):
+        return self.products.take(row_ids)
+
+    def nbytes(self):
+        return self.neighbours.nbytes + self.similarities.nbytes + self.key_hashes.nbytes + self.key_rows.nbytes
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import Future
+
+# Single-flight request coalescing.
+#
+# Concurrent callers asking for the same key share one in-flight call: the
+# first caller (the leader) does the work, everyone arriving while it runs
+# waits on the leader's future instead of issuing a duplicate request. Keys
+# are forgotten as soon as the call finishes, so this is not a cache - later
+# callers start a fresh call (and usually hit a real cache first).
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def claim(self, key):
+        """(future, leader) for `key`. Only the leader runs the call, and it must resolve the future."""
+        with self._lock:
+            self.counters["calls"] += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.counters["executed"] += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, True
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), or wait for the identical call already in flight, and return its result."""
+        future, leader = self.claim(key)
+        if leader:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
+
+    def submit(self, key, executor, fn, *args, **kwargs):
+        """Like do(), but runs the call on `executor` and returns the shared future without waiting."""
+        future, leader = self.claim(key)
+        if leader:
+            try:
+                executor.submit(fn, *args, **kwargs).add_done_callback(lambda done: _resolve(future, done))
+            except BaseException as e:
+                future.set_exception(e)
+        return future
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._calls))
+
+
+def _resolve(future, done):
+    if done.cancelled():
+        future.cancel()
+    elif done.exception() is not None:
+        future.set_exception(done.exception())
+    else:
+        future.set_result(done.result())
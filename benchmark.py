@@ -0,0 +1,530 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from beautymate.catalog import load_catalog, normalize_products, filter_catalog, rank_products
+from beautymate.catalog_index import CatalogIndex
+from beautymate.scoring import ProductScorer
+from beautymate.similarity import SimilarityIndex
+from beautymate.search import SearchIndex, tokenize
+from beautymate.intents import INTENTS, Intent, IntentEngine
+from chat_memory import ChatMemory
+from session_schema import AGE_GROUPS, SKIN_TYPES, Profile, RecommendationRef
+from stub_servers import synthetic_products
+
+# Offline micro-benchmarks for the recommendation and chat paths.
+#
+#   python benchmark.py index --rows 20000
+#   python benchmark.py scoring --rows 20000
+#   python benchmark.py similar --rows 20000
+#   python benchmark.py search --rows 20000
+#   python benchmark.py intents --intents 500
+#   python benchmark.py rerun
+#   python benchmark.py workers --rows 20000 --workers 4
+#   python benchmark.py session --sessions 1000 --messages 20
+#
+# Uses the local catalog snapshot when one has been synced, otherwise a
+# synthetic catalog of --rows products shaped like makeup-api data. The
+# end-to-end flows and the multi-session load test, which run against stub
+# servers, live in loadtest.py. Both write their results as JSON with
+# --output; compare two runs with
+#
+#   python benchmark.py compare before.json after.json
+
+def synthetic_catalog(rows, seed=0):
+    return normalize_products(synthetic_products(rows, seed))
+
+
+def get_benchmark_catalog(rows):
+    catalog_df = load_catalog()
+    if catalog_df is not None:
+        return catalog_df, "snapshot"
+    return synthetic_catalog(rows), "synthetic"
+
+
+def time_calls(fn, queries, repeat=3):
+    """Per-call latencies in milliseconds for `fn(*query)` over every query, best of `repeat` passes."""
+    best = None
+    for _ in range(repeat):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            fn(*query)
+            timings.append((time.perf_counter() - started) * 1000)
+        if best is None or sum(timings) < sum(best):
+            best = timings
+    return np.array(best)
+
+
+# Everything reported by the current run, by label; written out with --output
+RESULTS = {}
+
+
+def record(label, **values):
+    RESULTS.setdefault(label, {}).update(values)
+
+
+def report(label, timings):
+    timings = np.asarray(timings, dtype=float)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    print(f"  {label:<24} p50 {p50:8.3f} ms   p95 {p95:8.3f} ms   p99 {p99:8.3f} ms")
+    record(label, count=len(timings), mean_ms=float(timings.mean()), p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path, benchmark, args):
+    """Write RESULTS, with what produced them, as JSON for run-to-run comparison."""
+    data = {"benchmark": benchmark, "timestamp": time.time(), "commit": git_commit(),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("benchmark", "files", "output")},
+            "results": RESULTS}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1)
+    print(f"Results written to {path}")
+
+
+# Lower is better for latencies and sizes, higher for rates
+def _better(field):
+    if field.endswith(("_ms", "_bytes")):
+        return -1
+    if field.endswith("_per_second"):
+        return 1
+    return 0
+
+
+def compare(args):
+    """Print how every shared metric moved between two result files; exit 1 if any got worse by more than --threshold."""
+    if len(args.files) != 2:
+        sys.exit("usage: benchmark.py compare BEFORE.json AFTER.json")
+    with open(args.files[0]) as f:
+        before = json.load(f)
+    with open(args.files[1]) as f:
+        after = json.load(f)
+    print(f"{before['benchmark']} {before.get('commit') or '?'} -> {after['benchmark']} {after.get('commit') or '?'}")
+    changed = sorted(k for k in set(before["args"]) | set(after["args"]) if before["args"].get(k) != after["args"].get(k))
+    if changed:
+        print("  note: runs used different settings: " + ", ".join(
+            f"{k} {before['args'].get(k)} -> {after['args'].get(k)}" for k in changed))
+
+    regressions = 0
+    for label, values in after["results"].items():
+        old_values = before["results"].get(label, {})
+        for field, value in values.items():
+            direction = _better(field)
+            old = old_values.get(field)
+            if not direction or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = change * direction < -args.threshold
+            regressions += worse
+            print(f"  {label + ' ' + field:<44} {old:12.3f} -> {value:12.3f}  {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    if regressions:
+        sys.exit(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+
+
+def random_queries(catalog_df, count, seed=1):
+    rng = random.Random(seed)
+    categories = [None] + sorted(catalog_df["product_type"].unique())
+    brands = [None] * 3 + sorted(catalog_df["brand"].unique())
+    queries = []
+    for _ in range(count):
+        low = rng.randrange(0, 50, 5)
+        queries.append((rng.choice(categories), rng.choice(brands), (low, rng.randrange(low + 5, 105, 5)),
+                        rng.choice([0.0, 2.5, 4.0])))
+    return queries
+
+
+def original_recommendations(products_df, price_range, min_rating, k=5):
+    """The recommendation chain as the app ran it before the catalog index: filter, full sort, head(k).
+
+    `products_df` is modified in place, as the app did with each fresh API response; pass a copy.
+    """
+    products_df['price'] = pd.to_numeric(products_df['price'], errors='coerce')
+    filtered_df = products_df.dropna(subset=['price'])
+    price_min, price_max = price_range
+    filtered_df = filtered_df[(filtered_df['price'] >= price_min) & (filtered_df['price'] <= price_max)]
+    if 'rating' in filtered_df.columns:
+        filtered_df['rating'] = pd.to_numeric(filtered_df['rating'], errors='coerce')
+        filtered_df = filtered_df[filtered_df['rating'] >= min_rating]
+    if 'rating' in filtered_df.columns and not filtered_df['rating'].isnull().all():
+        filtered_df = filtered_df.sort_values(by='rating', ascending=False)
+    else:
+        filtered_df = filtered_df.sort_values(by='price', ascending=True)
+    return filtered_df.head(k)
+
+
+def bench_index(args):
+    catalog_df, source = get_benchmark_catalog(args.rows)
+    queries = random_queries(catalog_df, args.queries)
+
+    started = time.perf_counter()
+    index = CatalogIndex(catalog_df)
+    print(f"Catalog: {len(catalog_df)} products ({source}), index built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def original_chain(category, brand, price_range, min_rating):
+        return original_recommendations(filter_catalog(catalog_df, category, brand), price_range, min_rating, k=5)
+
+    def pandas_top_k(category, brand, price_range, min_rating):
+        return rank_products(filter_catalog(catalog_df, category, brand), price_range, min_rating, k=5)
+
+    def indexed(category, brand, price_range, min_rating):
+        return index.query(category, brand, price_range, min_rating, k=5)
+
+    report("pandas sort + head", time_calls(original_chain, queries))
+    report("pandas top-k", time_calls(pandas_top_k, queries))
+    report("catalog index", time_calls(indexed, queries))
+
+
+def profile_queries(catalog_df, count, seed=2):
+    """random_queries() with a user profile appended to each."""
+    rng = random.Random(seed)
+    return [query + ({"gender": rng.choice(["Female", "Male", "Unisex", None]),
+                      "age_group": rng.choice(["Under 18", "18-24", "25-34", "35-44", "45+"]),
+                      "skin_type": rng.choice(["Dry", "Oily", "Combination", "Normal"])},)
+            for query in random_queries(catalog_df, count)]
+
+
+def bench_scoring(args):
+    catalog_df, source = get_benchmark_catalog(args.rows)
+    queries = profile_queries(catalog_df, args.queries)
+
+    started = time.perf_counter()
+    index = CatalogIndex(catalog_df)
+    scorer = ProductScorer(catalog_df)
+    print(f"Catalog: {len(catalog_df)} products ({source}), {scorer.matrix.shape[1]} features, "
+          f"index and features built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def pandas_rating(category, brand, price_range, min_rating, profile):
+        return rank_products(filter_catalog(catalog_df, category, brand), price_range, min_rating, k=5)
+
+    def pandas_personalized(category, brand, price_range, min_rating, profile):
+        return rank_products(filter_catalog(catalog_df, category, brand), price_range, min_rating, k=5, profile=profile)
+
+    def matrix_personalized(category, brand, price_range, min_rating, profile):
+        return index.query(category, brand, price_range, min_rating, k=5, scores=scorer.score_profile(**profile))
+
+    report("pandas, rating only", time_calls(pandas_rating, queries))
+    report("pandas, personalized", time_calls(pandas_personalized, queries))
+    report("feature matrix + index", time_calls(matrix_personalized, queries))
+    report("score whole catalog", time_calls(lambda *query: scorer.score_profile(**query[-1]), queries))
+
+
+def bench_similar(args):
+    import tracemalloc
+
+    catalog_df, source = get_benchmark_catalog(args.rows)
+    started = time.perf_counter()
+    similarity = SimilarityIndex(catalog_df)
+    build_seconds = time.perf_counter() - started
+
+    # Tracing allocations slows the build down, so measure the peak on a second, untimed build
+    tracemalloc.start()
+    SimilarityIndex(catalog_df)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"Catalog: {len(catalog_df)} products ({source}), index built in {build_seconds * 1000:.1f} ms, "
+          f"{similarity.nbytes() / 2 ** 20:.2f} MiB kept, {peak / 2 ** 20:.1f} MiB peak while building")
+
+    rng = random.Random(3)
+    rows = [(rng.randrange(len(catalog_df)),) for _ in range(args.queries)]
+    products = [(catalog_df.iloc[row],) for (row,) in rows]
+    report("similar(row)", time_calls(lambda row: similarity.similar(row, 5), rows))
+    report("lookup + similar", time_calls(lambda product: similarity.similar(similarity.row_of(product), 5), products))
+
+
+def search_queries(catalog_df, count, seed=4):
+    """1-3 catalog words per query; some are cut short (still typing) or have a letter dropped (typo)."""
+    rng = random.Random(seed)
+    vocabulary = sorted({word for text in catalog_df["name"].head(2000) for word in tokenize(text) if word.isalpha()})
+    queries = []
+    for base in random_queries(catalog_df, count, seed):
+        words = rng.sample(vocabulary, rng.randint(1, min(3, len(vocabulary))))
+        last = words[-1]
+        if len(last) > 4 and rng.random() < 0.3:
+            words[-1] = last[:rng.randint(3, len(last) - 1)]
+        elif len(last) > 4 and rng.random() < 0.3:
+            cut = rng.randrange(len(last))
+            words[-1] = last[:cut] + last[cut + 1:]
+        queries.append((" ".join(words),) + base)
+    return queries
+
+
+def bench_search(args):
+    catalog_df, source = get_benchmark_catalog(args.rows)
+    queries = search_queries(catalog_df, args.queries)
+
+    started = time.perf_counter()
+    search = SearchIndex(catalog_df)
+    index = CatalogIndex(catalog_df)
+    print(f"Catalog: {len(catalog_df)} products ({source}), {len(search.vocabulary)} terms, "
+          f"indexes built in {(time.perf_counter() - started) * 1000:.1f} ms, postings {search.nbytes() / 2 ** 20:.2f} MiB")
+
+    text = (catalog_df["name"] + " " + catalog_df["brand"] + " " + catalog_df["tags"] + " " + catalog_df["description"]).str.lower()
+
+    def pandas_contains(query, category, brand, price_range, min_rating):
+        # Substring match on every word - no ranking, stemming or typo tolerance
+        mask = np.ones(len(catalog_df), dtype=bool)
+        for word in tokenize(query):
+            mask &= text.str.contains(word, regex=False).to_numpy()
+        return rank_products(filter_catalog(catalog_df[mask], category, brand), price_range, min_rating, k=5)
+
+    def indexed(query, category, brand, price_range, min_rating):
+        row_ids, scores = search.search(query)
+        return index.query(category, brand, price_range, min_rating, k=5, scores=scores, within=row_ids)
+
+    report("pandas str.contains", time_calls(pandas_contains, queries))
+    report("BM25 index + filters", time_calls(indexed, queries))
+
+
+def synthetic_intents(count, seed=0):
+    rng = random.Random(seed)
+    intents = list(INTENTS)
+    for i in range(count - len(intents)):
+        keywords = [f"topic{i}", f"topic{i}s", f"alias{i} phrase", f"term{i}", f"{rng.choice(['matte', 'dewy', 'sheer'])} term{i}"]
+        intents.append(Intent(f"topic{i}", keywords, f"Answer about topic {i} for {{gender}} users.", None))
+    return intents
+
+
+def bench_intents(args):
+    intents = synthetic_intents(args.intents)
+    questions = ["What foundation should I use for oily skin?", "Which blush suits dry skin?",
+                 "How do I make my eyeliner last all day without smudging?",
+                 "Any tips for a matte term42 look with topic7s?", "Is this good for sensitive skin in winter?"]
+    queries = [(q,) for q in questions * (args.queries // len(questions))]
+
+    # The previous approach: rebuild a dict of answers and scan every keyword with substring tests
+    def linear_scan(question):
+        answers = {keyword: intent.offline.format(gender="female", skin_type="your", skin_type_title="Your")
+                   for intent in intents for keyword in intent.keywords}
+        question_lower = question.lower()
+        for keyword, response in answers.items():
+            if keyword in question_lower:
+                return response
+        return None
+
+    started = time.perf_counter()
+    engine = IntentEngine(intents)
+    print(f"Knowledge base: {len(intents)} intents, compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    report("linear keyword scan", time_calls(linear_scan, queries))
+    report("intent engine", time_calls(lambda q: engine.respond(q, "female"), queries))
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Script that calls just the chat panel function. AppTest always reruns a whole script and cannot trigger
+# an st.fragment rerun, so this measures the panel's own work as a stand-in for the fragment rerun; it
+# leaves out Streamlit's fragment dispatch. `import app` runs the rest of the app once, on the first run.
+CHAT_PANEL_SCRIPT = f"""
+import sys
+sys.path.insert(0, {os.path.dirname(APP_PATH)!r})
+import app
+app.chat_panel("All")
+"""
+
+
+def bench_rerun(args):
+    from streamlit.testing.v1 import AppTest
+
+    # Keep the runs offline and deterministic: keyword answers, no OpenAI calls
+    os.environ["OPENAI_API_KEY"] = ""
+
+    full = AppTest.from_file(APP_PATH, default_timeout=60)
+    full.run()
+    full.sidebar.button[0].click().run()
+    full.session_state["chat_visible"] = True
+
+    panel = AppTest.from_string(CHAT_PANEL_SCRIPT, default_timeout=60)
+    panel.session_state["chat_visible"] = True
+    panel.session_state["chat_memory"] = ChatMemory()
+    panel.session_state["chat_window"] = 20
+    panel.session_state["profile"] = Profile(skin_type="Dry")
+    panel.run()
+
+    runs = [()] * args.reruns
+    print(f"Per-interaction server time over {args.reruns} reruns (recommendations shown, chat open)")
+    report("full script rerun", time_calls(full.run, runs))
+    report("chat panel alone", time_calls(panel.run, runs))
+
+
+def _memory():
+    """Resident, proportional (shared pages split between the processes mapping them) and private bytes of this process."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) * 1024
+    return {"rss_bytes": fields["Rss"], "pss_bytes": fields["Pss"],
+            "private_bytes": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def _catalog_worker(directory, shared, queries, barrier, results):
+    from beautymate.catalog_provider import CatalogProvider
+
+    before = _memory()
+    if shared:
+        snapshot = CatalogProvider(directory, 0).current()
+        index, scorer, similarity, search = snapshot.index, snapshot.scorer, snapshot.similarity, snapshot.search
+    else:
+        # What every worker did before snapshots were shared: decode the catalog and build private indexes
+        products = load_catalog(directory)
+        index, scorer, similarity, search = CatalogIndex(products), ProductScorer(products), SimilarityIndex(products), SearchIndex(products)
+    for word, (category, brand, price_range, min_rating, profile) in queries:
+        row_ids = index.query(category, brand, price_range, min_rating, k=5, scores=scorer.score_profile(**profile))
+        if row_ids is not None and len(row_ids):
+            index.take(row_ids)
+            similarity.similar(row_ids[0])
+        search.search(word)
+    # Measure while every worker is alive, so shared pages are split between all of them
+    barrier.wait()
+    after = _memory()
+    results.put({name: after[name] - before[name] for name in after})
+    barrier.wait()
+
+
+def bench_workers(args):
+    import multiprocessing
+    import tempfile
+
+    from beautymate.catalog import open_catalog, write_snapshot
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("The workers benchmark reads /proc/self/smaps_rollup and needs Linux")
+        sys.exit(1)
+    context = multiprocessing.get_context("spawn")
+    print(f"Catalog memory per worker process, {args.workers} workers each")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in (args.rows, args.rows * 4):
+            directory = os.path.join(tmp, f"catalog-{rows}")
+            catalog_df = synthetic_catalog(rows)
+            write_snapshot(catalog_df, directory)
+            # The first process to open a snapshot builds its indexes; every later one maps them
+            open_catalog(directory).indexes(CatalogIndex, ProductScorer, SimilarityIndex, SearchIndex)
+            words = [query[0] for query in search_queries(catalog_df, args.queries)]
+            queries = list(zip(words, profile_queries(catalog_df, args.queries)))
+
+            for mode, shared in (("private copy", False), ("shared snapshot", True)):
+                barrier, results = context.Barrier(args.workers), context.Queue()
+                workers = [context.Process(target=_catalog_worker, args=(directory, shared, queries, barrier, results))
+                           for _ in range(args.workers)]
+                for worker in workers:
+                    worker.start()
+                measured = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                totals = {name: sum(m[name] for m in measured) / len(measured) for name in measured[0]}
+                record(f"{mode}, {rows} rows", **totals)
+                print(f"  {mode + ',':17} {rows:>7} rows   private {totals['private_bytes'] / 2 ** 20:7.1f} MiB   "
+                      f"pss {totals['pss_bytes'] / 2 ** 20:7.1f} MiB   rss {totals['rss_bytes'] / 2 ** 20:7.1f} MiB")
+
+
+def chat_messages(session, count):
+    """(role, text) of a session's chat, alternating questions and answers, distinct per session like real input."""
+    for i in range(count):
+        if i % 2 == 0:
+            yield "user", f"Which foundation suits oily skin and lasts through a long day? ({session}-{i})"
+        else:
+            yield "assistant", ("For oily skin, look for an oil-free, matte foundation with a long-wear formula. "
+                                "Set it with a light translucent powder and blot during the day. " * 2 + f"({session}-{i})")
+
+
+def _retained_per_call(build, count):
+    """Bytes still allocated per result after `count` calls to build(n), with every result kept alive."""
+    import tracemalloc
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(n) for n in range(count)]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return retained / count
+
+
+def bench_session(args):
+    import tempfile
+
+    from beautymate.catalog import open_catalog, write_snapshot
+
+    catalog_df, source = get_benchmark_catalog(args.rows)
+    rng = random.Random(6)
+    pages = [rng.sample(range(len(catalog_df)), 5) for _ in range(args.sessions)]
+
+    def compact_chat(n):
+        memory = ChatMemory()
+        for role, text in chat_messages(n, args.messages):
+            memory.append(role, text)
+        return memory
+
+    # Before: the rows themselves, a profile dict and a list of message dicts; after: session_schema
+    layouts = {
+        "recommendations": (lambda n: catalog_df.take(pages[n]),
+                            lambda n: RecommendationRef(1, np.asarray(pages[n], dtype=np.int32))),
+        "profile": (lambda n: {"name": f"User {n}", "age_group": AGE_GROUPS[n % 5], "skin_type": SKIN_TYPES[n % 4]},
+                    lambda n: Profile(f"User {n}", AGE_GROUPS[n % 5], SKIN_TYPES[n % 4])),
+        f"chat ({args.messages} messages)": (lambda n: [{"role": role, "content": text} for role, text in chat_messages(n, args.messages)],
+                                             compact_chat),
+    }
+    print(f"Catalog: {len(catalog_df)} products ({source}); retained bytes per session over {args.sessions} sessions")
+    totals = [0, 0]
+    for name, builds in layouts.items():
+        before, after = (_retained_per_call(build, args.sessions) for build in builds)
+        totals = [totals[0] + before, totals[1] + after]
+        record(name, before_bytes=before, after_bytes=after)
+        print(f"  {name:24} dataframe + dicts {before:8.0f} B   compact {after:8.0f} B   {before / max(after, 1):5.1f}x")
+    record("session total", before_bytes=totals[0], after_bytes=totals[1])
+    print(f"  {'total':24} dataframe + dicts {totals[0]:8.0f} B   compact {totals[1]:8.0f} B   {totals[0] / max(totals[1], 1):5.1f}x")
+
+    # The price of keeping ids: each render turns them back into rows
+    with tempfile.TemporaryDirectory() as tmp:
+        write_snapshot(catalog_df, tmp + "/catalog")
+        catalog = open_catalog(tmp + "/catalog")
+        report("resolve 5 row ids", time_calls(catalog.take, [(pages[n],) for n in range(min(args.queries, args.sessions))]))
+
+
+BENCHMARKS = {
+    "compare": compare,
+    "index": bench_index,
+    "intents": bench_intents,
+    "rerun": bench_rerun,
+    "scoring": bench_scoring,
+    "search": bench_search,
+    "session": bench_session,
+    "similar": bench_similar,
+    "workers": bench_workers,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeautyMate offline benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic catalog size when no snapshot exists")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--intents", type=int, default=500, help="knowledge base size for the intents benchmark")
+    parser.add_argument("--reruns", type=int, default=30, help="script runs per variant for the rerun benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent worker processes for the workers benchmark")
+    parser.add_argument("--sessions", type=int, default=1000, help="simulated sessions for the session benchmark")
+    parser.add_argument("--messages", type=int, default=20, help="chat messages per session for the session benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression in compare")
+    parser.add_argument("files", nargs="*", help="the two result files for compare")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+    if args.output and args.benchmark != "compare":
+        write_results(args.output, args.benchmark, args)
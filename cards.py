@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Product card HTML, memoized across reruns and sessions.
+#
+# A rendered card only depends on the product, the gender, the description,
+# the image URL and this template, so the fragment is cached under (product
+# key, gender, description hash, image URL, CARD_TEMPLATE_VERSION).
+# render_grid joins finished fragments into a single HTML block, so a whole
+# page of cards goes out as one st.markdown delta instead of one per card plus
+# a column layout per row.
+
+# Bump whenever CARD_TEMPLATE changes so cached fragments are rebuilt
+CARD_TEMPLATE_VERSION = 1
+CARD_CACHE_SIZE = 4096
+PLACEHOLDER_IMAGE = 'https://via.placeholder.com/400x200?text=Product+Image'
+
+CARD_TEMPLATE = """<div class="product-card">
+<div class="card-image-container">
+<img class="card-img" src="{image_url}" alt="{product_name}">
+<div class="card-category">{category}</div>
+</div>
+<div class="card-content">
+<h3 class="card-title">{product_name}</h3>
+<p class="card-brand">by {brand}</p>
+<p class="card-description">{description}</p>
+<div class="card-footer">
+<span class="card-price">${price}</span>
+<span class="card-rating">⭐ {rating}/5</span>
+</div>
+</div>
+</div>"""
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def product_key(product):
+    """Identity of a product as far as its card is concerned; sample products have no id, so fall back to name/brand."""
+    product_id = product.get('id')
+    if product_id is None or product_id != product_id:
+        product_id = f"{product.get('name', 'Product')}|{product.get('brand', 'Brand')}"
+    return (product_id, product.get('price', 0), product.get('rating', '4.5'))
+
+
+def product_card_html(product, description, image_url=None):
+    # Blank lines would end the HTML block in markdown, so keep the description on one line
+    return CARD_TEMPLATE.format(
+        image_url=image_url or product.get('image_link', PLACEHOLDER_IMAGE),
+        product_name=product.get('name', 'Product'),
+        category=product.get('product_type', 'Beauty').title(),
+        brand=product.get('brand', 'Brand'),
+        description=" ".join(description.split()),
+        price=float(product.get('price', 0)),
+        rating=product.get('rating', '4.5')
+    )
+
+
+def render_card(product, gender, description, image_url=None):
+    """Card HTML; `image_url` replaces the product's own image_link, e.g. with a local thumbnail."""
+    key = (product_key(product), gender, hashlib.sha1(description.encode("utf-8")).hexdigest(), image_url, CARD_TEMPLATE_VERSION)
+    with _lock:
+        html = _cache.get(key)
+        if html is not None:
+            _cache.move_to_end(key)
+            _counters["hits"] += 1
+            return html
+        _counters["misses"] += 1
+
+    html = product_card_html(product, description, image_url)
+    with _lock:
+        _cache[key] = html
+        while len(_cache) > CARD_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return html
+
+
+def render_grid(cells):
+    """One HTML block laying out card fragments (or skeletons) two per row."""
+    return "<div class=\"product-grid\">" + "".join(f"<div class=\"product-grid-cell\">{cell}</div>" for cell in cells) + "</div>"
+
+
+def card_cache_stats():
+    with _lock:
+        return dict(_counters, entries=len(_cache))
@@ -0,0 +1,108 @@
+import re
+from array import array
+
+# Per-session chat memory for Sofi.
+#
+# Messages are kept in an append-only buffer: one byte per message for the
+# role, the utf-8 text of all messages back to back in a single bytearray and
+# an array of end offsets, so a message costs its text plus five bytes rather
+# than a dict and a str object. The buffer is capped at `max_messages`;
+# anything older is folded into a short running summary (the only time the
+# buffer is cut), so a session's memory stays flat however long the
+# conversation gets. The UI only
+# renders a window of the most recent messages, and build_context() picks as
+# many recent turns as fit a token budget for the LLM, replacing the rest with
+# the summary.
+
+ROLES = ("user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+SUMMARY_MAX_CHARS = 600
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text, plus per-message overhead
+    return len(text) // 4 + 4
+
+
+def _first_sentence(text, limit=120):
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "..."
+
+
+def _note(code, content):
+    prefix = "User asked" if ROLES[code] == "user" else "Sofi said"
+    return f"{prefix}: {_first_sentence(content)}"
+
+
+def _join_summary(parts):
+    # Keep the most recent part of the summary when it gets too long, cut at a word boundary
+    summary = " ".join(filter(None, parts))
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = summary[-SUMMARY_MAX_CHARS:].split(" ", 1)[-1]
+    return summary
+
+
+class ChatMemory:
+    __slots__ = ("roles", "text", "ends", "summary", "folded", "max_messages")
+
+    def __init__(self, max_messages=60):
+        self.roles = bytearray()
+        self.text = bytearray()
+        self.ends = array("I")
+        self.summary = ""
+        self.folded = 0
+        self.max_messages = max_messages
+
+    def __len__(self):
+        return len(self.ends)
+
+    def content(self, i):
+        """Text of the i-th kept message."""
+        return self.text[self.ends[i - 1] if i else 0:self.ends[i]].decode("utf-8")
+
+    def append(self, role, content):
+        self.roles.append(ROLE_CODES[role])
+        self.text += content.encode("utf-8")
+        self.ends.append(len(self.text))
+        if len(self.ends) > self.max_messages:
+            self._fold(len(self.ends) - self.max_messages)
+
+    def _fold(self, count):
+        """Summarize and drop the `count` oldest messages."""
+        notes = [_note(self.roles[i], self.content(i)) for i in range(count)]
+        self.summary = _join_summary([self.summary] + notes)
+        cut = self.ends[count - 1]
+        del self.roles[:count]
+        del self.text[:cut]
+        self.ends = array("I", [end - cut for end in self.ends[count:]])
+        self.folded += count
+
+    def messages(self, last=None):
+        """The most recent `last` messages (all if None) as chat-completion dicts."""
+        start = 0 if last is None else max(0, len(self.ends) - last)
+        return [{"role": ROLES[self.roles[i]], "content": self.content(i)} for i in range(start, len(self.ends))]
+
+    def hidden_count(self, window):
+        return max(0, len(self.ends) - window)
+
+    def build_context(self, token_budget=800):
+        """Recent messages that fit in `token_budget` tokens, preceded by a summary of everything older."""
+        selected = []
+        # Leave room for the summary message
+        budget = token_budget - estimate_tokens("x" * SUMMARY_MAX_CHARS) - 8
+        used = 0
+        start = len(self.ends)
+        while start > 0:
+            cost = estimate_tokens(self.content(start - 1))
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+
+        # Turns that didn't fit are summarized along with those already folded away
+        summary = _join_summary([self.summary] + [_note(self.roles[i], self.content(i)) for i in range(start)])
+        if summary:
+            selected.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        selected.extend(self.messages(len(self.ends) - start))
+        return selected
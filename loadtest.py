@@ -0,0 +1,296 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from stub_servers import StubImageHost, StubMakeupApi, StubOpenAI, synthetic_products
+
+# End-to-end benchmarks and a multi-session load test, run entirely against
+# local stub servers (makeup-api, OpenAI and an image host).
+#
+#   python loadtest.py flows --llm-latency 0.5 --error-rate 0.05 --output flows.json
+#   python loadtest.py load --sessions 8 --interactions 6 --output load.json
+#
+# "flows" times the pieces of a page view one by one through beautymate.core:
+# catalog sync, the recommendation pipeline (index and pandas paths), sample
+# products, product descriptions and the consultant, each uncached and
+# cached. "load" drives whole app sessions with Streamlit's AppTest - page
+# load, recommendations, chat questions - spread over --workers app
+# processes, and reports per-interaction latency, throughput and memory per
+# session.
+#
+# The stubs and a scratch directory for the catalog and caches are set up
+# through the environment before any app module is imported, so nothing
+# touches the real services or the caches under data/ and static/thumbs.
+# Results use the same JSON format as benchmark.py, so `python benchmark.py
+# compare` works on them.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+QUESTIONS = [
+    "What foundation should I use for oily skin?",
+    "Which blush suits dry skin?",
+    "How do I make my eyeliner last all day?",
+    "What's the best way to apply mascara without clumps?",
+    "Can you suggest a lipstick for a natural everyday look?",
+    "How do I choose a bronzer for fair skin?",
+    "What primer helps makeup last in humid weather?",
+    "Is cream or powder eyeshadow better for mature skin?",
+]
+
+
+def start_stubs(args, directory):
+    """Start the stub servers and point the app's configuration at them and at `directory`."""
+    # Separate seeds, so the stubs don't fail the same requests in lockstep
+    images = StubImageHost(latency=args.latency, seed=1).start()
+    products = synthetic_products(args.rows)
+    for i, product in enumerate(products):
+        # A few dozen distinct photos, like a catalog that reuses brand imagery
+        product["image_link"] = images.url(i % 40)
+    makeup = StubMakeupApi(products, latency=args.latency, error_rate=args.error_rate, seed=2).start()
+    llm = StubOpenAI(latency=args.llm_latency, error_rate=args.error_rate, seed=3).start()
+
+    os.environ.update({
+        "BEAUTYMATE_CATALOG_URL": makeup.url,
+        "BEAUTYMATE_CATALOG_DIR": os.path.join(directory, "catalog"),
+        "BEAUTYMATE_CATALOG_REFRESH": "0",
+        "BEAUTYMATE_LLM_CACHE": os.path.join(directory, "llm_cache.sqlite"),
+        "BEAUTYMATE_THUMB_DIR": os.path.join(directory, "thumbs"),
+        "BEAUTYMATE_THUMB_INDEX": os.path.join(directory, "thumbnails.sqlite"),
+        "OPENAI_BASE_URL": llm.base_url,
+        "OPENAI_API_KEY": "sk-stub",
+    })
+    return {"makeup": makeup, "openai": llm, "images": images}
+
+
+def timed(fn, calls):
+    """Latency in milliseconds of each `fn(*call)`, run once each (repeats would hit the caches)."""
+    timings = []
+    for call in calls:
+        started = time.perf_counter()
+        fn(*call)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by `obj` and everything it references (DataFrames and arrays by their buffers)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_size(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+def bench_flows(args, stubs):
+    from benchmark import profile_queries, record, report
+    from beautymate.catalog import CATALOG_DIR, filter_catalog, rank_products, sync_catalog
+    from beautymate.catalog_provider import CatalogProvider
+    from beautymate.llm_cache import ResponseCache
+    from beautymate.sample_catalog import SAMPLE_CATALOG
+    from beautymate.core import BeautyMate
+
+    print(f"Stubs: makeup-api {args.rows} products, {args.latency * 1000:.0f} ms; OpenAI {args.llm_latency * 1000:.0f} ms; "
+          f"{args.error_rate:.0%} errors")
+    report("catalog sync", timed(sync_catalog, [(CATALOG_DIR,)]))
+    report("catalog sync (304)", timed(lambda: sync_catalog(CATALOG_DIR, conditional=True), [()] * 5))
+    report("catalog load", timed(CatalogProvider, [(CATALOG_DIR, 0)]))
+
+    core = BeautyMate(CatalogProvider(CATALOG_DIR, 0))
+    snapshot = core.provider.current()
+    # The pandas baseline filters a decoded, per-process copy of the catalog
+    catalog_df = snapshot.products.frame()
+    queries = profile_queries(catalog_df, args.queries)
+
+    def recommend_pandas(category, brand, price_range, min_rating, profile):
+        return rank_products(filter_catalog(catalog_df, category, brand), price_range, min_rating, k=5, profile=profile)
+
+    report("recommend (index)", timed(core.recommend, queries))
+    report("recommend (pandas)", timed(recommend_pandas, queries))
+    categories = [None] + list(SAMPLE_CATALOG.categories)
+    report("get_sample_products", timed(core.sample_products, [(c,) for c in categories] * (args.queries // len(categories) + 1)))
+
+    # Distinct products and questions so the first pass always reaches the stub
+    cache = ResponseCache(":memory:")
+    products = [(catalog_df.iloc[row], random.Random(row).choice(["Female", "Male", "All"]), cache)
+                for row in random.Random(5).sample(range(len(catalog_df)), min(args.llm_calls, len(catalog_df)))]
+    report("description", timed(core.describe, products))
+    report("description (cached)", timed(core.describe, products))
+
+    questions = [(f"{random.Random(i).choice(QUESTIONS)[:-1]} for product {i}?", "Female") for i in range(args.llm_calls)]
+    report("consultant", timed(core.ask, questions))
+    report("consultant (cached)", timed(core.ask, questions))
+
+    for name, stub in stubs.items():
+        record(f"stub {name}", **stub.counters)
+    print("  stub requests: " + ", ".join(f"{name} {stub.counters['requests']} ({stub.counters['errors']} errors)"
+                                          for name, stub in stubs.items()))
+
+
+class LoadSession:
+    """One simulated user: loads the page, then alternates recommendations and chat questions."""
+
+    def __init__(self, number):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.rng = random.Random(number)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=120)
+
+    def interaction(self, i):
+        """(name, action) of this session's i-th interaction; 0 is the page load."""
+        if i == 0:
+            return "page load", self.app.run
+        return ("recommend", self.recommend) if i % 2 else ("chat question", self.ask)
+
+    def recommend(self):
+        category = self.app.sidebar.selectbox[0]
+        category.select(self.rng.choice(category.options))
+        self.app.sidebar.button[0].click().run()
+
+    def ask(self):
+        if not any(button.key == "close_chat" for button in self.app.button):
+            self.app.button(key="open_chat").click().run()
+        self.app.text_input(key="user_question").input(self.rng.choice(QUESTIONS))
+        next(button for button in self.app.button if button.label == "Send").click().run()
+
+    def state_size(self):
+        return deep_size({key: self.app.session_state[key] for key in self.app.session_state})
+
+
+def drive(sessions, interactions, latencies, failures):
+    """Run every session's interactions round-robin, recording latencies (ms) by interaction name."""
+    for i in range(interactions + 1):
+        for session in sessions:
+            name, action = session.interaction(i)
+            started = time.perf_counter()
+            try:
+                action()
+            except Exception as e:
+                failures.append(f"session {session.number} {name}: {e!r}")
+                continue
+            latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+            if session.app.exception:
+                failures.append(f"session {session.number} {name}: {session.app.exception[0].message}")
+
+
+def load_worker(worker, numbers, args):
+    """One app process: drive `numbers` sessions; worker 0 also measures what a session retains."""
+    latencies, failures = {}, []
+    sessions = [LoadSession(number) for number in numbers]
+    drive(sessions, args.interactions, latencies, failures)
+    state_sizes = [session.state_size() for session in sessions]
+
+    retained = None
+    if worker == 0 and args.memory_sessions:
+        # Replay a few sessions under tracemalloc now that the shared caches are warm; what they
+        # still hold afterwards is per-session memory (including AppTest's own element tree)
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        kept = [LoadSession(-1 - i) for i in range(args.memory_sessions)]
+        drive(kept, args.interactions, {}, failures)
+        gc.collect()
+        retained = (tracemalloc.get_traced_memory()[0] - baseline) / len(kept)
+        tracemalloc.stop()
+    return latencies, failures, state_sizes, retained
+
+
+def bench_load(args, stubs):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    from benchmark import record, report
+    from beautymate.catalog import sync_catalog
+
+    sync_catalog()
+    workers = max(1, min(args.workers, args.sessions))
+    print(f"{args.sessions} sessions in {workers} app process(es) x (page load + {args.interactions} interactions), "
+          f"OpenAI stub {args.llm_latency * 1000:.0f} ms, {args.error_rate:.0%} errors")
+
+    # AppTest swaps a process-wide runtime in and out around every run, so runs in one process can't
+    # overlap: sessions take turns within a process, and processes provide the concurrency
+    started = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(load_worker, range(workers),
+                                [range(w, args.sessions, workers) for w in range(workers)], [args] * workers))
+    elapsed = time.perf_counter() - started
+
+    latencies, failures, state_sizes, retained = {}, [], [], None
+    for worker_latencies, worker_failures, worker_state_sizes, worker_retained in results:
+        for name, timings in worker_latencies.items():
+            latencies.setdefault(name, []).extend(timings)
+        failures += worker_failures
+        state_sizes += worker_state_sizes
+        retained = worker_retained if worker_retained is not None else retained
+
+    for name, timings in latencies.items():
+        report(name, timings)
+    interactions = sum(len(timings) for timings in latencies.values())
+    record("throughput", interactions=interactions, seconds=elapsed, interactions_per_second=interactions / elapsed)
+    print(f"  throughput               {interactions / elapsed:8.2f} interactions/s over {elapsed:.1f} s (incl. startup)")
+
+    record("memory per session", session_state_bytes=float(np.mean(state_sizes)), retained_bytes=retained)
+    print(f"  memory per session       {np.mean(state_sizes) / 1024:8.1f} KiB session state"
+          + (f", {retained / 1024:.1f} KiB retained" if retained is not None else ""))
+
+    record("failures", count=len(failures))
+    for failure in failures[:10]:
+        print(f"  FAILED {failure}")
+    for name, stub in stubs.items():
+        record(f"stub {name}", **stub.counters)
+    print("  stub requests: " + ", ".join(f"{name} {stub.counters['requests']} ({stub.counters['errors']} errors)"
+                                          for name, stub in stubs.items()))
+
+
+LOADTESTS = {
+    "flows": bench_flows,
+    "load": bench_load,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeautyMate end-to-end benchmarks and load test against stub servers")
+    parser.add_argument("benchmark", choices=sorted(LOADTESTS))
+    parser.add_argument("--rows", type=int, default=2000, help="products served by the makeup-api stub")
+    parser.add_argument("--latency", type=float, default=0.05, help="makeup-api and image stub latency, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="OpenAI stub latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests answered with a 503")
+    parser.add_argument("--queries", type=int, default=200, help="recommendation queries for flows")
+    parser.add_argument("--llm-calls", type=int, default=20, help="descriptions and questions for flows")
+    parser.add_argument("--sessions", type=int, default=8, help="simulated users for load")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="app processes the sessions are spread over")
+    parser.add_argument("--interactions", type=int, default=6, help="interactions per session after the page load")
+    parser.add_argument("--memory-sessions", type=int, default=3, help="sessions replayed under tracemalloc for load")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="beautymate-loadtest-") as directory:
+        stubs = start_stubs(args, directory)
+        try:
+            LOADTESTS[args.benchmark](args, stubs)
+            if args.output:
+                from benchmark import write_results
+                write_results(args.output, args.benchmark, args)
+        finally:
+            for stub in stubs.values():
+                stub.stop()
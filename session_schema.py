@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Compact per-session state for the Streamlit app.
+#
+# Every connected user has a session_state, so with thousands of sessions its
+# size is most of the server's memory. Sessions therefore keep references
+# instead of data:
+#
+#   recommendations  RecommendationRef: the catalog version plus an int32 array
+#                    of row ids, turned back into rows by BeautyMate.rows() when
+#                    the page renders (about a quarter of a millisecond per page)
+#   profile          Profile: the name plus one small int packing the AGE_GROUPS and
+#                    SKIN_TYPES codes
+#   chat_memory      ChatMemory: roles, text and offsets in append-only buffers
+
+AGE_GROUPS = ("Under 18", "18-24", "25-34", "35-44", "45+")
+SKIN_TYPES = ("Dry", "Oily", "Combination", "Normal")
+
+RecommendationRef = namedtuple("RecommendationRef", ["version", "row_ids"])
+
+
+def recommendation_ref(products_df, version):
+    """A reference to `products_df` (whose index holds row ids, see BeautyMate.recommend) in catalog `version`."""
+    return RecommendationRef(version, products_df.index.to_numpy(dtype=np.int32))
+
+
+def _code(options, value):
+    return options.index(value) + 1 if value in options else 0
+
+
+class Profile:
+    # Both enum codes share one small int (CPython caches those), so the name is the only per-session object
+    __slots__ = ("name", "code")
+
+    def __init__(self, name="", age_group=None, skin_type=None):
+        self.name = name
+        self.code = _code(AGE_GROUPS, age_group) * (len(SKIN_TYPES) + 1) + _code(SKIN_TYPES, skin_type)
+
+    @property
+    def age_group(self):
+        age_code = self.code // (len(SKIN_TYPES) + 1)
+        return AGE_GROUPS[age_code - 1] if age_code else None
+
+    @property
+    def skin_type(self):
+        skin_code = self.code % (len(SKIN_TYPES) + 1)
+        return SKIN_TYPES[skin_code - 1] if skin_code else None
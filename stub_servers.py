@@ -0,0 +1,288 @@
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for external services, for offline development and benchmarks.
+#
+#   python stub_servers.py makeup --port 8100 --rows 2000 --latency 0.2
+#
+# then point the app at it with BEAUTYMATE_CATALOG_URL=http://127.0.0.1:8100/api/v1/products.json
+#
+#   python stub_servers.py openai --port 8101 --latency 0.8
+#
+# with OPENAI_BASE_URL=http://127.0.0.1:8101/v1 OPENAI_API_KEY=sk-stub
+
+PRODUCT_TYPES = ["blush", "bronzer", "eyebrow", "eyeliner", "eyeshadow", "foundation",
+                 "lip_liner", "lipstick", "mascara", "nail_polish"]
+TAGS = ["Vegan", "Natural", "Gluten Free", "Organic", "cruelty free", "oil free", "silicone free", "Canadian"]
+
+
+def synthetic_products(rows, seed=0):
+    """Raw product records shaped like makeup-api's products.json."""
+    rng = random.Random(seed)
+    brands = [f"brand {i}" for i in range(max(10, rows // 100))]
+    products = []
+    for i in range(rows):
+        product_type = rng.choice(PRODUCT_TYPES)
+        products.append({
+            "id": i,
+            "name": f"{rng.choice(['Velvet', 'Matte', 'Glow', 'Silk', 'Pure'])} {product_type.replace('_', ' ').title()} {i}",
+            "brand": rng.choice(brands),
+            "price": f"{rng.uniform(2, 90):.2f}" if rng.random() > 0.05 else None,
+            "rating": round(rng.uniform(1, 5), 1) if rng.random() > 0.3 else None,
+            "product_type": product_type,
+            "image_link": f"https://example.com/{i}.jpg",
+            "description": "A long-lasting formula for dry, oily or combination skin. " * rng.randint(1, 4),
+            "tag_list": rng.sample(TAGS, rng.randint(0, 3)),
+        })
+    return products
+
+
+class StubServer:
+    """Threaded HTTP server on 127.0.0.1 with injectable latency and error rate."""
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.counters = {"requests": 0, "errors": 0}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._dispatch(self, "GET")
+
+            def do_POST(self):
+                stub._dispatch(self, "POST")
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # Clients dropping keep-alive connections (e.g. a benchmark process exiting) is not an error
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.server = Server(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def _dispatch(self, handler, method):
+        with self.lock:
+            self.counters["requests"] += 1
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.counters["errors"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            self.send_json(handler, 503, {"error": "injected failure"})
+            return
+        self.handle(handler, method)
+
+    def handle(self, handler, method):
+        self.send_json(handler, 404, {"error": "not found"})
+
+    def send_json(self, handler, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubMakeupApi(StubServer):
+    """makeup-api products.json with product_type/brand filters and ETag/Last-Modified revalidation."""
+
+    def __init__(self, products=None, rows=500, **kwargs):
+        super().__init__(**kwargs)
+        self.counters["not_modified"] = 0
+        self.set_products(products if products is not None else synthetic_products(rows))
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/api/v1/products.json"
+
+    def set_products(self, products):
+        body = json.dumps(products).encode("utf-8")
+        with self.lock:
+            self.products = products
+            self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self.last_modified = formatdate(time.time(), usegmt=True)
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        if method != "GET" or url.path != "/api/v1/products.json":
+            return super().handle(handler, method)
+
+        with self.lock:
+            products, etag, last_modified = self.products, self.etag, self.last_modified
+        validators = {"ETag": etag, "Last-Modified": last_modified}
+        if handler.headers.get("If-None-Match") == etag or (
+                not handler.headers.get("If-None-Match") and handler.headers.get("If-Modified-Since") == last_modified):
+            with self.lock:
+                self.counters["not_modified"] += 1
+            handler.send_response(304)
+            for name, value in validators.items():
+                handler.send_header(name, value)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        query = parse_qs(url.query)
+        for field in ("product_type", "brand"):
+            if field in query:
+                products = [p for p in products if (p.get(field) or "").lower() == query[field][0].lower()]
+        self.send_json(handler, 200, products, validators)
+
+
+class StubImageHost(StubServer):
+    """Full-size JPEG product photos at /img/<n>.jpg, generated once per image number."""
+
+    def __init__(self, width=1600, height=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.size = (width, height)
+        self.images = {}
+
+    def url(self, number):
+        return f"http://127.0.0.1:{self.port}/img/{number}.jpg"
+
+    def image(self, number):
+        from PIL import Image, ImageDraw
+
+        if number not in self.images:
+            rng = random.Random(number)
+            image = Image.new("RGB", self.size, tuple(rng.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(image)
+            for _ in range(40):
+                x, y = rng.randrange(self.size[0]), rng.randrange(self.size[1])
+                draw.ellipse((x, y, x + rng.randrange(40, 400), y + rng.randrange(40, 400)),
+                             fill=tuple(rng.randrange(256) for _ in range(3)))
+            output = io.BytesIO()
+            image.save(output, "JPEG", quality=92)
+            self.images[number] = output.getvalue()
+        return self.images[number]
+
+    def handle(self, handler, method):
+        match = re.fullmatch(r"/img/(\d+)\.jpg", urlparse(handler.path).path)
+        if method != "GET" or match is None:
+            return super().handle(handler, method)
+        body = self.image(int(match.group(1)))
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class StubOpenAI(StubServer):
+    """OpenAI-compatible /v1/chat/completions, streaming or not, answering from a hash of the prompt.
+
+    Batch description prompts (which ask for "JSON only") get a JSON reply with one entry per product line.
+    """
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def reply(self, prompt):
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        if "JSON only" in prompt:
+            count = prompt.count("| Brand:")
+            return json.dumps({"descriptions": [{"id": i, "description": f"Stub description {digest}-{i}. Lasts all day."}
+                                                for i in range(1, count + 1)]})
+        return f"Stub answer {digest}. It suits your skin type and lasts all day. Apply a thin layer and build up as needed."
+
+    def handle(self, handler, method):
+        if method != "POST" or urlparse(handler.path).path != "/v1/chat/completions":
+            return super().handle(handler, method)
+        body = json.loads(handler.rfile.read(int(handler.headers.get("Content-Length", 0))) or b"{}")
+        content = self.reply(body.get("messages", [{}])[-1].get("content", ""))
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": 1, "completion_tokens": len(content) // 4, "total_tokens": 1 + len(content) // 4}
+
+        if not body.get("stream"):
+            self.send_json(handler, 200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send_chunk(data):
+            event = f"data: {data}\n\n".encode("utf-8")
+            handler.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            handler.wfile.flush()
+
+        for word in content.split(" "):
+            send_chunk(json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }))
+        send_chunk("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+STUBS = {
+    "makeup": StubMakeupApi,
+    "images": StubImageHost,
+    "openai": StubOpenAI,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub service")
+    parser.add_argument("service", choices=sorted(STUBS))
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--rows", type=int, default=500, help="catalog size for the makeup stub")
+    args = parser.parse_args()
+
+    kwargs = {"port": args.port, "latency": args.latency, "error_rate": args.error_rate}
+    if args.service == "makeup":
+        kwargs["rows"] = args.rows
+    stub = STUBS[args.service](**kwargs).start()
+    print(f"{args.service} stub listening on http://127.0.0.1:{stub.port}")
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The beautymate package and stub_servers live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from beautymate.catalog import sync_catalog  # noqa: E402
+from stub_servers import StubMakeupApi  # noqa: E402
+
+
+@pytest.fixture
+def makeup_api():
+    with StubMakeupApi(rows=200) as api:
+        yield api
+
+
+@pytest.fixture
+def catalog_dir(makeup_api, tmp_path):
+    """A snapshot directory synced once from `makeup_api`."""
+    directory = str(tmp_path / "catalog")
+    sync_catalog(directory, url=makeup_api.url)
+    return directory
@@ -0,0 +1,133 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from beautymate.catalog import snapshot_info
+from beautymate.catalog_provider import CatalogProvider
+from stub_servers import synthetic_products
+
+# CatalogProvider against StubMakeupApi: swaps, revalidation, failures and readers holding old snapshots.
+
+
+def provider(catalog_dir, makeup_api, interval=0):
+    return CatalogProvider(catalog_dir, interval, url=makeup_api.url)
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_changed_catalog_is_swapped_in(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api)
+    assert catalog.current().version == 1 and len(catalog.current().products) == 200
+
+    makeup_api.set_products(synthetic_products(300, seed=1))
+    assert catalog.refresh()
+
+    snapshot = catalog.current()
+    assert snapshot.version == 2
+    assert len(snapshot.products) == snapshot.index.size == snapshot.scorer.size == snapshot.search.size == 300
+    assert snapshot_info(catalog_dir)["etag"] == makeup_api.etag
+    assert catalog.counters["updated"] == 1 and catalog.counters["not_modified"] == 0
+
+
+def test_unchanged_catalog_is_revalidated(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api)
+    checked_at = snapshot_info(catalog_dir)["checked_at"]
+
+    assert not catalog.refresh()
+
+    assert catalog.current().version == 1
+    assert catalog.counters["not_modified"] == 1 and makeup_api.counters["not_modified"] == 1
+    assert snapshot_info(catalog_dir)["checked_at"] > checked_at
+
+
+def test_snapshot_written_by_another_process_is_reloaded(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api)
+    makeup_api.set_products(synthetic_products(300, seed=1))
+
+    # Another worker on the same directory syncs first and writes the new snapshot
+    script = ("import sys; from beautymate.catalog_provider import CatalogProvider; "
+              "sys.exit(0 if CatalogProvider(sys.argv[1], 0, url=sys.argv[2]).refresh() else 1)")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, "-c", script, catalog_dir, makeup_api.url], env=env, check=True, timeout=60)
+
+    # This worker's conditional request now carries the new ETag and gets a 304
+    assert catalog.refresh()
+    assert makeup_api.counters["not_modified"] == 1
+    assert catalog.current().version == 2 and len(catalog.current().products) == 300
+
+
+def test_due_refresh_skips_the_request_after_another_process_checked(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api, interval=3600)
+    makeup_api.set_products(synthetic_products(300, seed=1))
+    provider(catalog_dir, makeup_api).refresh()
+    requests_before = makeup_api.counters["requests"]
+
+    assert catalog.refresh(if_due=True)
+
+    assert makeup_api.counters["requests"] == requests_before
+    assert catalog.counters["skipped"] == 1 and len(catalog.current().products) == 300
+
+
+def test_failed_refresh_keeps_the_old_snapshot_and_backs_off(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api, interval=0.2)
+    old = catalog.current()
+    # An empty catalog is rejected without the HTTP retries a 5xx would get
+    makeup_api.set_products([])
+
+    catalog.start()
+    try:
+        time.sleep(1.0)
+        failures = catalog.counters["failures"]
+        # Backing off min(interval, 300) after each failure: about one attempt per interval, not a tight loop
+        assert 1 <= failures <= 6
+        assert catalog.current() is old and catalog.last_error
+
+        makeup_api.set_products(synthetic_products(300, seed=1))
+        wait_until(lambda: catalog.current().version == 2)
+    finally:
+        catalog.stop()
+    assert catalog.last_error is None and len(catalog.current().products) == 300
+
+
+def test_readers_keep_the_old_snapshot_across_a_swap(catalog_dir, makeup_api):
+    catalog = provider(catalog_dir, makeup_api)
+    old = catalog.current()
+    old_rows = old.products.take(np.arange(5))
+    makeup_api.set_products(synthetic_products(300, seed=1))
+
+    inconsistent = []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            snapshot = catalog.current()
+            sizes = {len(snapshot.products), snapshot.index.size, snapshot.scorer.size,
+                     snapshot.similarity.size, snapshot.search.size}
+            if len(sizes) != 1:
+                inconsistent.append(sizes)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        assert catalog.refresh()
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert not inconsistent
+    # The old directory is gone from disk, but its mapped files still serve the old rows
+    assert catalog.current().version == 2 and catalog.snapshot(old.version) is old
+    assert old.products.take(np.arange(5)).equals(old_rows)
+    assert len(old.products) == old.index.size == 200
+    assert old.search.size == 200 and old.similarity.size == 200
@@ -0,0 +1,25 @@
+import io
+
+from PIL import Image
+
+from thumbnails import THUMB_SIZE, make_thumbnail
+
+
+def thumbnail_of(width, height):
+    source = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 140)).save(source, "JPEG")
+    with Image.open(io.BytesIO(make_thumbnail(source.getvalue()))) as thumbnail:
+        return thumbnail.size
+
+
+def test_card_width_image_is_cropped_to_the_box():
+    # The default catalog's Unsplash images are 800px wide but taller than the box
+    assert thumbnail_of(800, 533) == THUMB_SIZE
+
+
+def test_large_image_is_cropped_and_downscaled():
+    assert thumbnail_of(1600, 1000) == THUMB_SIZE
+
+
+def test_small_image_is_cropped_but_not_upscaled():
+    assert thumbnail_of(400, 300) == (400, 200)
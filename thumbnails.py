@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from beautymate.clients import get_image_session
+from beautymate.llm_cache import ResponseCache, cache_key
+from beautymate import metrics
+
+# Card-size thumbnails for product images, served by the app itself.
+#
+# Remote images are fetched once in the background, cropped and downscaled to
+# the card's image box and re-encoded as WebP (JPEG when Pillow lacks WebP).
+# Thumbnails are stored content-addressed (file name = hash of the encoded
+# bytes) under static/thumbs, which Streamlit serves at app/static/thumbs/
+# (see .streamlit/config.toml); tiny ones are inlined as data URIs instead. A
+# SQLite index maps source URL -> thumbnail, and the directory is kept under
+# a byte budget by evicting the least recently used files.
+#
+# url_for() never blocks on the network: until a thumbnail exists it returns
+# the original URL and queues the fetch, so the next render picks it up.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Streamlit only serves static/thumbs; another directory is for tests and load runs that never load the images
+THUMB_DIR = os.getenv("BEAUTYMATE_THUMB_DIR", os.path.join(APP_DIR, "static", "thumbs"))
+THUMB_URL_PREFIX = "app/static/thumbs/"
+THUMB_INDEX_PATH = os.getenv("BEAUTYMATE_THUMB_INDEX", os.path.join(APP_DIR, "data", "thumbnails.sqlite"))
+THUMB_CACHE_BYTES = int(float(os.getenv("BEAUTYMATE_THUMB_CACHE_MB", 200)) * 2 ** 20)
+
+# Twice the 200px-high card image box, so thumbnails stay sharp on high-DPI screens
+THUMB_SIZE = (800, 400)
+THUMB_FORMAT, THUMB_MIME = ("WEBP", "image/webp") if features.check("webp") else ("JPEG", "image/jpeg")
+THUMB_QUALITY = 78
+# Bump whenever size/format/quality change so existing thumbnails are rebuilt
+# 2: images no wider than the box are cropped to its aspect ratio too
+THUMB_VERSION = 2
+
+DATA_URI_MAX_BYTES = 4096
+MAX_SOURCE_BYTES = 15 * 2 ** 20
+FETCH_TIMEOUT = 10
+FETCH_WORKERS = 4
+RETRY_FAILED_AFTER = 600
+
+
+def thumbnail_size(width, height):
+    """The card box, or the largest box-shaped size inside a smaller image (thumbnails are never upscaled)."""
+    scale = min(width / THUMB_SIZE[0], height / THUMB_SIZE[1], 1)
+    return max(1, round(THUMB_SIZE[0] * scale)), max(1, round(THUMB_SIZE[1] * scale))
+
+
+def make_thumbnail(data):
+    """Encoded thumbnail bytes for raw image bytes."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", THUMB_SIZE)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        # Crop to the box's aspect ratio, downscaling only images larger than the box
+        size = thumbnail_size(*image.size)
+        thumbnail = ImageOps.fit(image, size, Image.LANCZOS) if image.size != size else image
+    options = {"method": 4} if THUMB_FORMAT == "WEBP" else {"optimize": True, "progressive": True}
+    output = io.BytesIO()
+    thumbnail.save(output, THUMB_FORMAT, quality=THUMB_QUALITY, **options)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    def __init__(self, directory=THUMB_DIR, index_path=THUMB_INDEX_PATH, max_bytes=THUMB_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index = ResponseCache(index_path, ttl=90 * 24 * 3600, max_entries=100000)
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="thumbnails")
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.failed = {}
+        self.counters = {"hits": 0, "misses": 0, "fetched": 0, "failures": 0, "evictions": 0,
+                         "source_bytes": 0, "thumbnail_bytes": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def url_for(self, source_url):
+        """URL to put in the card for `source_url`: the local thumbnail when ready, otherwise the original."""
+        if not isinstance(source_url, str) or not source_url.startswith(("http://", "https://")):
+            return source_url
+        key = cache_key(source_url, THUMB_VERSION)
+        entry = self.index.get(key)
+        if entry is not None:
+            url = self._resolve(json.loads(entry))
+            if url is not None:
+                with self.lock:
+                    self.counters["hits"] += 1
+                return url
+
+        with self.lock:
+            self.counters["misses"] += 1
+        self._schedule(source_url, key)
+        return source_url
+
+    def prefetch(self, source_urls):
+        """Start fetching thumbnails for images about to be shown."""
+        for source_url in source_urls:
+            self.url_for(source_url)
+
+    def _resolve(self, entry):
+        if "data" in entry:
+            return entry["data"]
+        path = os.path.join(self.directory, entry["name"])
+        try:
+            used_at = os.stat(path).st_mtime
+        except OSError:
+            # Evicted: fetch it again
+            return None
+        # mtime doubles as the last-used time for eviction; refresh it at most hourly
+        if time.time() - used_at > 3600:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return THUMB_URL_PREFIX + entry["name"]
+
+    def _schedule(self, source_url, key):
+        with self.lock:
+            if key in self.pending or time.time() - self.failed.get(key, 0) < RETRY_FAILED_AFTER:
+                return
+            self.pending.add(key)
+        self.executor.submit(self._fetch, source_url, key)
+
+    def _fetch(self, source_url, key):
+        try:
+            with metrics.timer("image_fetch"), get_image_session().get(source_url, timeout=FETCH_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+            if len(data) > MAX_SOURCE_BYTES:
+                raise ValueError(f"image larger than {MAX_SOURCE_BYTES} bytes")
+            thumbnail = make_thumbnail(data)
+            self.index.set(key, json.dumps(self._store(thumbnail)))
+            with self.lock:
+                self.counters["fetched"] += 1
+                self.counters["source_bytes"] += len(data)
+                self.counters["thumbnail_bytes"] += len(thumbnail)
+                self.failed.pop(key, None)
+        except (requests.RequestException, OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError):
+            with self.lock:
+                self.counters["failures"] += 1
+                self.failed[key] = time.time()
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def _store(self, thumbnail):
+        if len(thumbnail) <= DATA_URI_MAX_BYTES:
+            return {"data": f"data:{THUMB_MIME};base64," + base64.b64encode(thumbnail).decode("ascii")}
+
+        name = hashlib.sha256(thumbnail).hexdigest()[:32] + "." + THUMB_FORMAT.lower()
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp-{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(thumbnail)
+            os.replace(tmp_path, path)
+            with self.lock:
+                self.total_bytes += len(thumbnail)
+                over_budget = self.total_bytes > self.max_bytes
+            if over_budget:
+                self._evict()
+        return {"name": name}
+
+    def _evict(self):
+        # Least recently used first, down to 90% of the budget so eviction doesn't run on every write
+        files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.directory) if entry.is_file() and ".tmp-" not in entry.name)
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in files:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self.lock:
+            self.total_bytes = total
+            self.counters["evictions"] += evicted
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, pending=len(self.pending), cached_bytes=self.total_bytes)
+        stats["bytes_saved"] = stats["source_bytes"] - stats["thumbnail_bytes"]
+        return stats